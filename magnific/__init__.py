@@ -1,4 +1,4 @@
-from .llm_config import LLMConfig
+from .llm_config import LLMConfig, RateLimit, RetryPolicy
 from .llm_providers import (
     OpenAIProvider,
     AnthropicProvider,
@@ -9,12 +9,24 @@ from .llm_providers import (
     XAIProvider,
     GeminiProvider,
 )
+from .cache import CachedProvider, SQLiteCache
+from .pricing import ModelPrice, PRICING
 from .conversation import LLMConversation
+from .stop_detectors import (
+    StopDetector,
+    RepetitionDetector,
+    GoodbyeDetector,
+    EmptyResponseDetector,
+    TokenCeilingDetector,
+    default_stop_detectors,
+)
 from .evaluation import Evaluation
 from .test_runner import TestRunner
 
 __all__ = [
     'LLMConfig',
+    'RateLimit',
+    'RetryPolicy',
     'OpenAIProvider',
     'AnthropicProvider',
     'TogetherAIProvider',
@@ -23,7 +35,17 @@ __all__ = [
     'CerebrasProvider',
     'XAIProvider',
     'GeminiProvider',
+    'CachedProvider',
+    'SQLiteCache',
+    'ModelPrice',
+    'PRICING',
     'LLMConversation',
+    'StopDetector',
+    'RepetitionDetector',
+    'GoodbyeDetector',
+    'EmptyResponseDetector',
+    'TokenCeilingDetector',
+    'default_stop_detectors',
     'Evaluation',
     'TestRunner'
 ]
\ No newline at end of file
@@ -1,12 +1,48 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import multiprocessing
 
-from magnific import LLMConfig, OpenAIProvider, LLMConversation, TestRunner, Evaluation
+from magnific import LLMConfig, LLMConversation, Evaluation
+from magnific.jobs import JobQueue, start_workers
+from magnific.llm_providers import OpenAIProvider
+from magnific.provider_registry import provider_for, resolve_provider_class
 from magnific.synthetic_data import SyntheticDataGenerator, SyntheticDataConfig
 
-app = FastAPI()
+# Reruns are queued and run by worker processes (see magnific-serve), so requests return immediately.
+# magnific-serve replaces this with the queue it was started with, and registers its workers.
+job_queue: Optional[JobQueue] = None
+workers: List[multiprocessing.Process] = []
+
+# Workers started when the app is served some other way, e.g. `uvicorn magnific.api:app`
+DEFAULT_WORKERS = 2
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = []
+    if not workers:
+        # Without workers, queued jobs would never run
+        started = start_workers(DEFAULT_WORKERS, get_job_queue().path)
+        workers.extend(started)
+    try:
+        yield
+    finally:
+        for process in started:
+            process.terminate()
+            workers.remove(process)
+
+app = FastAPI(lifespan=lifespan)
+
+def get_job_queue() -> JobQueue:
+    global job_queue
+    if job_queue is None:
+        job_queue = JobQueue()
+    return job_queue
 
 # Configure CORS
 app.add_middleware(
@@ -20,6 +56,8 @@ app.add_middleware(
 class RerunRequest(BaseModel):
     config: Dict[str, Any]
     test_results: List[Dict[str, Any]]
+    # Judge model, independent of the service agent's model; the judge always runs on OpenAI
+    eval_model: str = "gpt-4o"
 
 class GenerateSyntheticDataRequest(BaseModel):
     service_prompt: str
@@ -28,51 +66,139 @@ class GenerateSyntheticDataRequest(BaseModel):
     max_threads: int = Field(default=5, le=10)  # Limit to 10 threads max
     temperature: float = Field(default=0.8, ge=0, le=2.0)
 
-@app.post("/api/rerun")
-async def rerun_evaluations(request: RerunRequest):
-    try:
-        # Create test runner
-        runner = TestRunner(eval_model=request.config["params"]["model"])
-        
-        # Initialize list to store all conversations
-        all_conversations = []
-        
-        # Create conversations for each test result
-        for test in request.test_results:
-            # Configure service provider with new config
-            service_config = LLMConfig(
-                params=request.config["params"],
-                system_prompt=request.config["system_prompt"],
-                end_call_enabled=request.config["end_call_enabled"]
-            )
-            
-            # Keep original customer config
-            customer_config = LLMConfig(**test["customer_config"])
-            
-            # Create conversation
-            conversation = LLMConversation(
-                service_provider=OpenAIProvider(config=service_config),
-                customer_provider=OpenAIProvider(config=customer_config),
-                type=test["call_type"],
-                first_message=test["transcript"].split("\n\n")[1].split(": ")[1],
-                evaluations=[
-                    Evaluation(name=result["name"], prompt=result["reason"]) 
-                    for result in test["evaluation_results"]
-                ]
-            )
-            
-            all_conversations.append(conversation)
-        
-        # Run all tests
-        results = await runner.run_tests(conversations=all_conversations, max_turns=20)
-        
-        return {"success": True, "results": results}
+def get_first_message(test: Dict[str, Any]) -> str:
+    """First utterance of a saved test, from its structured record when available."""
+    if test.get("first_message"):
+        return test["first_message"]
+    if test.get("turns"):
+        return test["turns"][0]["content"]
+    # Results saved before turns were recorded only have the transcript text
+    return test["transcript"].split("\n\n")[1].split(": ", 1)[1]
+
+def build_provider(config: Dict[str, Any]):
+    """Provider for a saved or edited agent config. Its optional "provider" field wins over the model name;
+    rows with the same config share one instance."""
+    llm_config = LLMConfig(**{name: value for name, value in config.items() if name != "provider"})
+    return provider_for(llm_config, provider=config.get("provider"))
+
+def build_rerun_conversations(request: RerunRequest) -> List[LLMConversation]:
+    """One conversation per saved test, with the new service config and the test's own customer config."""
+    # Configure service provider with new config
+    service_provider = build_provider(request.config)
+    all_conversations = []
+    for test in request.test_results:
+        # Create conversation, keeping the original customer config
+        conversation = LLMConversation(
+            service_provider=service_provider,
+            customer_provider=build_provider(test["customer_config"]),
+            type=test["call_type"],
+            first_message=get_first_message(test),
+            evaluations=[
+                Evaluation(name=result["name"], prompt=result["reason"]) 
+                for result in test["evaluation_results"]
+            ]
+        )
         
+        all_conversations.append(conversation)
+    return all_conversations
+
+def check_eval_model(eval_model: str) -> None:
+    """Raise ValueError unless eval_model is served by OpenAI, where the judge sends its requests."""
+    if resolve_provider_class(eval_model) is not OpenAIProvider:
+        raise ValueError(f"eval_model must be an OpenAI model; {eval_model!r} is not")
+
+def get_rerun_test_ids(request: RerunRequest) -> Optional[List[Any]]:
+    """Keep the uploaded test IDs so streamed results replace the matching table rows."""
+    test_ids = [test.get("test_id") for test in request.test_results]
+    if None in test_ids or len(set(test_ids)) != len(test_ids):
+        return None
+    return test_ids
+
+@app.post("/api/rerun", status_code=202)
+async def rerun_evaluations(request: RerunRequest, x_magnific_user: Optional[str] = Header(None)):
+    """Queue a rerun job and return its ID; results stream from /api/jobs/{job_id}/events."""
+    try:
+        check_eval_model(request.eval_model)
+        all_conversations = build_rerun_conversations(request)
+        test_ids = get_rerun_test_ids(request) or list(range(1, len(all_conversations) + 1))
+        job = await asyncio.to_thread(
+            get_job_queue().submit,
+            "rerun",
+            payload={
+                "conversations": [conversation.to_spec() for conversation in all_conversations],
+                "test_ids": test_ids,
+                "runner_options": {"eval_model": request.eval_model},
+                "max_turns": 20
+            },
+            total=len(all_conversations),
+            user=x_magnific_user or "anonymous"
+        )
+    except ValueError as e:
+        # Unknown provider, a model no provider is known to serve, or a non-OpenAI judge
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         import traceback
         print(f"Error in rerun_evaluations: {str(e)}")
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return {"success": True, "job_id": job.id, "total": job.total}
+
+async def get_job_or_404(job_id: str):
+    # Queue calls are blocking SQLite; run them off the event loop
+    job = await asyncio.to_thread(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+@app.get("/api/jobs")
+async def list_jobs(user: Optional[str] = None, limit: int = 100):
+    jobs = await asyncio.to_thread(get_job_queue().list, user=user, limit=limit)
+    return {"jobs": [job.to_dict() for job in jobs]}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await get_job_or_404(job_id)
+    return {**job.to_dict(), "results": await asyncio.to_thread(get_job_queue().results, job_id)}
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued job, or stop a running one after the tests already in progress."""
+    await get_job_or_404(job_id)
+    return (await asyncio.to_thread(get_job_queue().cancel, job_id)).to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """Server-sent events: "status" when the job is claimed, one "result" per finished test, then "done".
+    Browsers reconnecting send Last-Event-ID and only receive the events they missed."""
+    await get_job_or_404(job_id)
+    queue = get_job_queue()
+    
+    async def event_stream():
+        last_seq = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+        idle = 0.0
+        while True:
+            events = await asyncio.to_thread(queue.events, job_id, after=last_seq)
+            for event in events:
+                last_seq = event["seq"]
+                yield f"id: {event['seq']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+                if event["event"] == "done":
+                    return
+            if not events and await asyncio.to_thread(queue.get, job_id) is None:
+                return  # pruned while we were following it
+            # Workers write events from other processes, so poll the queue
+            idle = 0.0 if events else idle + 0.5
+            if idle >= 15.0:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            await asyncio.sleep(0.5)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/api/generate-synthetic")
 async def generate_synthetic_data(request: GenerateSyntheticDataRequest):
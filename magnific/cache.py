@@ -0,0 +1,293 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+from magnific.llm_providers import LLMProvider
+from magnific.usage import Usage
+
+def get_default_cache_path() -> Path:
+    """Get the default cache file (~/.cache/magnific/cache.sqlite)."""
+    return Path.home() / ".cache" / "magnific" / "cache.sqlite"
+
+def _json_default(obj: Any) -> Any:
+    # Gemini tools are pydantic models rather than plain dicts
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude_none=True)
+    return repr(obj)
+
+def hash_key(*parts: Any) -> str:
+    """Stable content hash of JSON-serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, default=_json_default, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SQLiteCache:
+    """Key/value store in SQLite with size-bounded LRU eviction.
+
+    Values are JSON-encoded. Several caches can share one file by using
+    different namespaces; the size limit applies per namespace. Reads don't
+    commit: their LRU timestamps are written in batches of touch_batch, and
+    before any eviction or close. The *_async methods run in a worker thread
+    so lookups don't block the event loop.
+    """
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        namespace: str = "default",
+        max_bytes: int = 512 * 1024 * 1024,
+        touch_batch: int = 256
+    ):
+        self.path = Path(path) if path else get_default_cache_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.touch_batch = touch_batch
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}  # key -> last read, not yet written
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, last_access)")
+        self._conn.commit()
+        row = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        self._total_bytes = row[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Values of the keys that are cached; missing keys are left out."""
+        found = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                row = self._conn.execute(
+                    "SELECT value FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    continue
+                self._touched[key] = time.time()
+                self.hits += 1
+                found[key] = json.loads(row[0])
+            if len(self._touched) >= self.touch_batch:
+                self._flush_touches()
+                self._conn.commit()
+        return found
+
+    def _flush_touches(self) -> None:
+        # Caller holds the lock and commits
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE cache SET last_access = ? WHERE namespace = ? AND key = ?",
+                [(last_access, self.namespace, key) for key, last_access in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()
+            return row is not None
+
+    def set(self, key: str, value: Any) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        """Store several values in one transaction."""
+        if not items:
+            return
+        encoded_items = [(key, json.dumps(value, ensure_ascii=False)) for key, value in items.items()]
+        with self._lock:
+            for key, encoded in encoded_items:
+                size = len(encoded.encode("utf-8"))
+                previous = self._conn.execute(
+                    "SELECT size FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, encoded, size, time.time())
+                )
+                self._total_bytes += size - (previous[0] if previous else 0)
+                self._touched.pop(key, None)
+            if self._total_bytes > self.max_bytes:
+                self._flush_touches()  # so eviction sees recent reads
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        # Drop least recently used entries until we are back under the size limit
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM cache WHERE namespace = ? ORDER BY last_access LIMIT 64",
+                (self.namespace,)
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def contains_async(self, key: str) -> bool:
+        return await asyncio.to_thread(self.contains, key)
+
+    async def set_async(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    async def get_many_async(self, keys: List[str]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.get_many, keys)
+
+    async def set_many_async(self, items: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self.set_many, items)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "bytes": self._total_bytes}
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_touches()
+            self._conn.commit()
+            self._conn.close()
+
+class CachedProvider(LLMProvider):
+    """Wraps any LLMProvider and replays completions for identical requests.
+
+    The key covers the wrapped provider class, config.params, the messages,
+    the tools and end_call_enabled, so any change to the request is a miss.
+    """
+    def __init__(self, provider: LLMProvider, cache: Optional[SQLiteCache] = None):
+        self.provider = provider
+        self.cache = cache if cache is not None else SQLiteCache(namespace="completions")
+
+    @property
+    def config(self):
+        return self.provider.config
+
+    def to_spec(self) -> Dict:
+        return {
+            "class": type(self),
+            "provider": self.provider.to_spec(),
+            "cache": {
+                "path": str(self.cache.path),
+                "namespace": self.cache.namespace,
+                "max_bytes": self.cache.max_bytes,
+                "touch_batch": self.cache.touch_batch
+            }
+        }
+
+    @classmethod
+    def from_spec(cls, spec: Dict) -> "CachedProvider":
+        provider_spec = spec["provider"]
+        return cls(provider_spec["class"].from_spec(provider_spec), SQLiteCache(**spec["cache"]))
+
+    @property
+    def name(self) -> str:
+        return self.provider.name
+
+    def end_conversation(self, messages: List[Dict]) -> None:
+        self.provider.end_conversation(messages)
+
+    def cache_key(self, messages: List[Dict], end_call_enabled: bool = True, tools: Optional[List[Dict]] = None) -> str:
+        return hash_key(
+            f"{type(self.provider).__module__}.{type(self.provider).__qualname__}",
+            self.provider.config.params,
+            messages,
+            tools or [],
+            end_call_enabled
+        )
+
+    def contains(self, messages: List[Dict], end_call_enabled: bool = True, tools: Optional[List[Dict]] = None) -> bool:
+        return self.cache.contains(self.cache_key(messages, end_call_enabled, tools))
+
+    async def contains_async(self, messages: List[Dict], end_call_enabled: bool = True, tools: Optional[List[Dict]] = None) -> bool:
+        return await self.cache.contains_async(self.cache_key(messages, end_call_enabled, tools))
+
+    def get_completion(
+            self,
+            messages: List[Dict],
+            end_call_enabled: bool = True,
+            tools: Optional[List[Dict]] = None
+    ) -> tuple[str, Optional[Dict]]:
+        return self.get_completion_with_usage(messages, end_call_enabled, tools)[:2]
+
+    async def get_completion_async(
+            self,
+            messages: List[Dict],
+            end_call_enabled: bool = True,
+            tools: Optional[List[Dict]] = None
+    ) -> tuple[str, Optional[Dict]]:
+        return (await self.get_completion_with_usage_async(messages, end_call_enabled, tools))[:2]
+
+    def _lookup(self, key: str) -> Optional[tuple[str, Optional[Dict], Usage]]:
+        usage = Usage.begin()
+        return self._replay(self.cache.get(key), usage)
+
+    async def _lookup_async(self, key: str) -> Optional[tuple[str, Optional[Dict], Usage]]:
+        usage = Usage.begin()
+        return self._replay(await self.cache.get_async(key), usage)
+
+    @staticmethod
+    def _replay(cached: Optional[List], usage: Usage) -> Optional[tuple[str, Optional[Dict], Usage]]:
+        if cached is None:
+            return None
+        # Nothing was billed for a replayed completion
+        usage.cache_hit = True
+        usage.input_tokens = usage.output_tokens = 0
+        return cached[0], cached[1], usage.end()
+
+    def get_completion_with_usage(
+            self,
+            messages: List[Dict],
+            end_call_enabled: bool = True,
+            tools: Optional[List[Dict]] = None
+    ) -> tuple[str, Optional[Dict], Usage]:
+        key = self.cache_key(messages, end_call_enabled, tools)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        message_content, end_call_detected, usage = self.provider.get_completion_with_usage(messages, end_call_enabled, tools)
+        self.cache.set(key, [message_content, end_call_detected])
+        return message_content, end_call_detected, usage
+
+    async def get_completion_with_usage_async(
+            self,
+            messages: List[Dict],
+            end_call_enabled: bool = True,
+            tools: Optional[List[Dict]] = None
+    ) -> tuple[str, Optional[Dict], Usage]:
+        key = self.cache_key(messages, end_call_enabled, tools)
+        cached = await self._lookup_async(key)
+        if cached is not None:
+            return cached
+        message_content, end_call_detected, usage = await self.provider.get_completion_with_usage_async(messages, end_call_enabled, tools)
+        await self.cache.set_async(key, [message_content, end_call_detected])
+        return message_content, end_call_detected, usage
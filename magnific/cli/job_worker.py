@@ -0,0 +1,17 @@
+import argparse
+from magnific.jobs import get_default_queue_path, run_worker
+
+def main():
+    parser = argparse.ArgumentParser(description="Run jobs from a magnific job queue until interrupted.")
+    parser.add_argument("--queue", default=str(get_default_queue_path()), help="SQLite file holding the job queue")
+    parser.add_argument(
+        "--max-jobs-per-user",
+        type=int,
+        default=1,
+        help="Running jobs allowed per user; use the same value as magnific-serve"
+    )
+    args = parser.parse_args()
+    run_worker(args.queue, args.max_jobs_per_user)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,30 @@
+import argparse
 import uvicorn
+from magnific import api
 from magnific.api import app
+from magnific.jobs import JobQueue, get_default_queue_path, start_workers
 
 def main():
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    parser = argparse.ArgumentParser(description="Serve the magnific web UI API with a pool of job workers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--queue", default=str(get_default_queue_path()), help="SQLite file holding the job queue")
+    parser.add_argument("--workers", type=int, default=2, help="Number of worker processes running jobs")
+    parser.add_argument(
+        "--max-jobs-per-user",
+        type=int,
+        default=1,
+        help="Running jobs allowed per user (X-Magnific-User header); further jobs wait in the queue"
+    )
+    args = parser.parse_args()
+    
+    api.job_queue = JobQueue(args.queue)
+    # Jobs interrupted by the last shutdown; jobs held by live external workers are left alone
+    requeued = api.job_queue.requeue_running()
+    if requeued:
+        print(f"Requeued {requeued} interrupted jobs")
+    api.workers = start_workers(args.workers, args.queue, args.max_jobs_per_user)
+    uvicorn.run(app, host=args.host, port=args.port)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
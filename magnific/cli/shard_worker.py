@@ -0,0 +1,18 @@
+import argparse
+from magnific.sharding import run_available_shards
+
+def main():
+    parser = argparse.ArgumentParser(description="Run pending shards from a shared magnific work directory.")
+    parser.add_argument("work_dir", help="Work directory written by magnific.sharding.prepare_shards")
+    parser.add_argument(
+        "--rate-limit-share",
+        type=float,
+        default=1.0,
+        help="Fraction of each configured rate limit this worker may use (e.g. 0.25 with four workers)"
+    )
+    args = parser.parse_args()
+    ran = run_available_shards(args.work_dir, args.rate_limit_share)
+    print(f"Finished shards: {ran}")
+
+if __name__ == "__main__":
+    main()
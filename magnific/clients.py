@@ -0,0 +1,91 @@
+"""Process-wide registry of vendor SDK clients.
+
+Building a client is expensive: each one owns its own connection pool, so a new
+client per provider, evaluator or rerun pays DNS, TCP and TLS setup again on its
+first request. Clients here are shared by everything using the same
+(client class, base_url, api_key), and use large keep-alive pools and HTTP/2
+when the h2 package is installed (pip install httpx[http2]).
+
+Async clients hold connections bound to the event loop that opened them, so they
+are shared per running loop rather than per process.
+"""
+import asyncio
+import importlib
+import importlib.util
+import sys
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+import httpx
+from google import genai
+from google.genai import types
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Enough keep-alive connections for a few hundred concurrent conversations per vendor,
+# held open across the pauses between turns
+POOL_LIMITS = {"max_connections": 512, "max_keepalive_connections": 256, "keepalive_expiry": 120.0}
+
+_lock = threading.Lock()
+_clients: Dict[Tuple, Any] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, Any]]" = weakref.WeakKeyDictionary()
+
+def _pool_args(http_module) -> Dict[str, Any]:
+    return {"limits": http_module.Limits(**POOL_LIMITS), "http2": HTTP2_AVAILABLE}
+
+def _http_client(client_class: type, asynchronous: bool) -> Optional[Any]:
+    """The SDK's own default HTTP client class, configured with the shared pool settings."""
+    sdk = importlib.import_module(client_class.__module__.rsplit("._", 1)[0])
+    default_class = getattr(sdk, "DefaultAsyncHttpxClient" if asynchronous else "DefaultHttpxClient", None)
+    if default_class is None:
+        return None
+    # Some SDKs ship their own fork of httpx; build the limits from the module they use
+    http_module = sys.modules[default_class.__mro__[1].__module__.split(".")[0]]
+    return default_class(**_pool_args(http_module))
+
+def _build(client_class: type, api_key: Optional[str], base_url: Optional[str], asynchronous: bool) -> Any:
+    if client_class is genai.Client:
+        # genai creates its own httpx clients from these arguments
+        return genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(client_args=_pool_args(httpx), async_client_args=_pool_args(httpx))
+        )
+    kwargs = {"api_key": api_key, "max_retries": 0}
+    http_client = _http_client(client_class, asynchronous)
+    if http_client is not None:
+        kwargs["http_client"] = http_client
+    if base_url is not None:
+        kwargs["base_url"] = base_url
+    return client_class(**kwargs)
+
+def get_client(client_class: type, api_key: Optional[str], base_url: Optional[str] = None) -> Any:
+    """Shared synchronous client. Retries are left to magnific.retry, so SDK retries are disabled."""
+    key = (client_class, base_url, api_key)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = _build(client_class, api_key, base_url, asynchronous=False)
+        return client
+
+def get_async_client(client_class: type, api_key: Optional[str], base_url: Optional[str] = None) -> Any:
+    """Shared async client for the running event loop (or a process-wide one outside a loop)."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    key = (client_class, base_url, api_key, "async")
+    with _lock:
+        if loop is None:
+            clients = _clients
+        else:
+            clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = _build(client_class, api_key, base_url, asynchronous=True)
+        return client
+
+def clear_clients() -> None:
+    """Forget every shared client, e.g. after a fork or when API keys change."""
+    with _lock:
+        _clients.clear()
+        _async_clients.clear()
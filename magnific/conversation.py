@@ -1,7 +1,45 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 from magnific.llm_providers import LLMProvider
-from dataclasses import field
+from magnific.cache import CachedProvider, hash_key
+from dataclasses import dataclass, field, asdict
 from magnific.evaluation import Evaluation
+from magnific.usage import Usage
+from magnific.stop_detectors import StopDetector
+import time
+
+@dataclass
+class Turn:
+    """One utterance in a conversation.
+
+    Attributes:
+        speaker (str): "service_agent" or "customer_agent"
+        content (str): What was said
+        latency (float): Seconds spent getting this reply from the provider, including retries
+        ttft (float): Seconds to the first token of the successful request (streaming only)
+        mean_token_gap (float): Mean seconds between streamed chunks (streaming only)
+        max_token_gap (float): Longest stall between streamed chunks (streaming only)
+        input_tokens (int): Prompt tokens billed for this reply, if reported
+        output_tokens (int): Completion tokens billed for this reply, if reported
+        cached_tokens (int): Prompt tokens served from the vendor's prompt cache, if reported
+        cache_write_tokens (int): Prompt tokens written to the vendor's prompt cache, if reported
+        end_call (bool): Whether the speaker ended the call with this turn
+        cache_hit (bool): Whether the reply was replayed from a CachedProvider instead of requested
+    """
+    speaker: str
+    content: str
+    latency: Optional[float] = None
+    ttft: Optional[float] = None
+    mean_token_gap: Optional[float] = None
+    max_token_gap: Optional[float] = None
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    cache_write_tokens: Optional[int] = None
+    end_call: bool = False
+    cache_hit: bool = False
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
 
 class LLMConversation:
     def __init__(self, 
@@ -9,11 +47,15 @@ class LLMConversation:
                  customer_provider: LLMProvider,
                  type: str = "inbound",
                  first_message: str = "Hi, I'd like to order a pizza",
-                 evaluations: List[Evaluation] = None):
+                 evaluations: List[Evaluation] = None,
+                 stop_detectors: Optional[List[StopDetector]] = None):
         self.service_provider = service_provider
         self.customer_provider = customer_provider
         self.type = type
+        self.first_message = first_message
         self.evaluations = evaluations if evaluations is not None else []
+        # Checked after every turn; the first to fire ends the conversation early
+        self.stop_detectors = stop_detectors or []
         
         # Initialize conversation based on type
         if self.type == "inbound":
@@ -27,9 +69,101 @@ class LLMConversation:
             self.first_provider = self.service_provider
             self.second_provider = self.customer_provider
             
-        self.conversation_history = [{"speaker": self.first_speaker, "content": first_message}]
+        # Structured turn log; the transcript text is rendered from it on demand
+        self.turns: List[Turn] = [Turn(speaker=self.first_speaker, content=first_message)]
+        self.started = False
+        # "end_call", "error", "max_turns", or the reason of the stop detector that fired
+        self.stop_reason: Optional[str] = None
+        self.stopped_by: Optional[str] = None
+        self.stop_detail: Optional[str] = None
+        self._transcript_cache: Optional[tuple] = None
+        # Append-only message list per speaker (system prompt first, own turns as 'assistant'),
+        # extended by one message per recorded turn instead of rebuilt on every request
+        self.perspective_messages = {
+            self.first_speaker: [
+                {"role": "system", "content": self.first_provider.config.system_prompt},
+                {"role": "assistant", "content": first_message}
+            ],
+            self.second_speaker: [
+                {"role": "system", "content": self.second_provider.config.system_prompt},
+                {"role": "user", "content": first_message}
+            ]
+        }
         self.call_active = True
-        self.transcript = ""  # Initialize empty transcript
+        # Optional rate limiter set by TestRunner; paces requests per provider/model
+        self.scheduler = None
+        # Per-request attempt timings, and the fatal error that aborted the call (if any)
+        self.request_attempts: List[Dict] = []
+        self.error: Optional[str] = None
+
+    def to_spec(self) -> Dict:
+        """Picklable description of this test, for running it in another process."""
+        return {
+            "service_provider": self.service_provider.to_spec(),
+            "customer_provider": self.customer_provider.to_spec(),
+            "type": self.type,
+            "first_message": self.first_message,
+            "evaluations": self.evaluations,
+            "stop_detectors": self.stop_detectors
+        }
+
+    @classmethod
+    def from_spec(cls, spec: Dict) -> "LLMConversation":
+        return cls(
+            service_provider=spec["service_provider"]["class"].from_spec(spec["service_provider"]),
+            customer_provider=spec["customer_provider"]["class"].from_spec(spec["customer_provider"]),
+            type=spec["type"],
+            first_message=spec["first_message"],
+            evaluations=spec["evaluations"],
+            stop_detectors=spec.get("stop_detectors")
+        )
+
+    def fingerprint(self) -> str:
+        """Stable hash of everything that defines this test (agent configs, type, first message, evaluations).
+        Used to recognize already-completed scenarios when resuming a run."""
+        def describe(provider: LLMProvider) -> Dict:
+            return {
+                "provider": provider.name,
+                "params": provider.config.params,
+                "system_prompt": provider.config.system_prompt,
+                "end_call_enabled": provider.config.end_call_enabled
+            }
+        parts = [
+            describe(self.service_provider),
+            describe(self.customer_provider),
+            self.type,
+            self.first_message,
+            [[evaluation.name, evaluation.prompt] for evaluation in self.evaluations]
+        ]
+        if self.stop_detectors:
+            # Only added when set, so fingerprints from runs without detectors stay valid
+            parts.append([repr(detector) for detector in self.stop_detectors])
+        return hash_key(*parts)
+
+    @property
+    def conversation_history(self) -> List[Dict]:
+        return [{"speaker": turn.speaker, "content": turn.content} for turn in self.turns]
+
+    @property
+    def transcript(self) -> str:
+        """Plain-text transcript, rendered from the turn log and cached until the next turn."""
+        if not self.started:
+            return ""
+        state = (len(self.turns), self.stop_reason)
+        if self._transcript_cache is None or self._transcript_cache[0] != state:
+            self._transcript_cache = (state, self.render_transcript())
+        return self._transcript_cache[1]
+
+    def render_transcript(self) -> str:
+        parts = [f"Starting {self.type} conversation\n\n"]
+        parts.extend(f"{turn.speaker}: {turn.content}\n\n" for turn in self.turns)
+        if self.stop_reason == "end_call":
+            parts.append(f"Conversation ended via end_call() function by {self.stopped_by}.\n")
+        elif self.stop_reason == "error":
+            parts.append(f"Conversation aborted: {self.stopped_by} failed to respond ({self.error}).\n")
+        elif self.stop_detail is not None:
+            parts.append(f"Conversation stopped early after {self.stopped_by}'s turn: {self.stop_detail}.\n")
+        return "".join(parts)
 
     def end_call(self):
         """This function can be called by the LLM to end the conversation."""
@@ -37,64 +171,182 @@ class LLMConversation:
 
     def get_conversation_from_perspective(self, speaker: str) -> List[Dict]:
         """
-        Transcribe conversation history from the perspective of the given speaker.
+        Conversation history from the perspective of the given speaker, starting with its system prompt.
         For each LLM, their own messages are seen as 'assistant' and the other LLM's as 'user'.
         """
-        perspective_history = []
-        for message in self.conversation_history:
-            role = "assistant" if message["speaker"] == speaker else "user"
-            perspective_history.append({
-                "role": role,
-                "content": message["content"]
-            })
-        return perspective_history
-
-    def get_llm_response(self, provider: LLMProvider, speaker: str) -> str:
-        messages = [{"role": "system", "content": provider.config.system_prompt}]
-        messages.extend(self.get_conversation_from_perspective(speaker))
+        # A copy, so callers can't alter the list sent on the next turn
+        return list(self.perspective_messages[speaker])
+
+    def _build_messages(self, provider: LLMProvider, speaker: str) -> List[Dict]:
+        # Shared, not copied: providers must treat the message list as read-only
+        return self.perspective_messages[speaker]
+
+    def _append_message(self, speaker: str, content: str) -> None:
+        for viewer, messages in self.perspective_messages.items():
+            messages.append({"role": "assistant" if viewer == speaker else "user", "content": content})
+
+    def _make_turn(self, speaker: str, message_content: str, end_call_detected: bool, usage: Usage, latency: float) -> Turn:
+        if end_call_detected:
+            self.end_call()
+            message_content = "Thank you, bye."
+        return Turn(
+            speaker=speaker,
+            content=message_content,
+            latency=latency,
+            ttft=usage.ttft,
+            mean_token_gap=usage.mean_token_gap,
+            max_token_gap=usage.max_token_gap,
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            cached_tokens=usage.cached_tokens,
+            cache_write_tokens=usage.cache_write_tokens,
+            end_call=end_call_detected,
+            cache_hit=usage.cache_hit
+        )
+
+    def _record_attempts(self, speaker: str, attempts: List) -> None:
+        for attempt in attempts:
+            self.request_attempts.append({"speaker": speaker, **attempt.to_dict()})
+
+    def _handle_error(self, speaker: str, error: Exception) -> None:
+        # Retries are exhausted or the error is fatal: stop the call instead of
+        # feeding an empty turn to the other agent and the judge
+        print(f"Error getting LLM response: {error}")
+        self.error = f"{speaker}: {error!r}"
+        self.call_active = False
+
+    def take_turn(self, provider: LLMProvider, speaker: str) -> Optional[Turn]:
+        """Get the speaker's next turn, or None if the provider failed after retries."""
+        messages = self._build_messages(provider, speaker)
+        attempts = []
         
         try:
-            message_content, end_call_detected = provider.get_completion(messages, provider.config.end_call_enabled)
-            if end_call_detected:
-                self.end_call()
-                return "Thank you, bye."
-            return message_content
+            start = time.perf_counter()
+            message_content, end_call_detected, usage = provider.complete(
+                messages, provider.config.end_call_enabled, attempts=attempts
+            )
+            return self._make_turn(speaker, message_content, end_call_detected, usage, time.perf_counter() - start)
         except Exception as e:
-            print(f"Error getting LLM response: {e}")
-            return ""
+            self._handle_error(speaker, e)
+            return None
+        finally:
+            self._record_attempts(speaker, attempts)
+
+    async def take_turn_async(self, provider: LLMProvider, speaker: str) -> Optional[Turn]:
+        """Get the speaker's next turn, or None if the provider failed after retries."""
+        messages = self._build_messages(provider, speaker)
+        attempts = []
+        reservation = None
+        
+        try:
+            # Cache hits never reach the vendor, so they don't count against its quota or budget
+            cached = isinstance(provider, CachedProvider) and await provider.contains_async(messages, provider.config.end_call_enabled)
+            if self.scheduler is not None and not cached:
+                reservation = self.scheduler.reserve_budget(provider.config.params.get("model"), messages, provider.config.params)
+                await self.scheduler.throttle_provider(provider, messages)
+            start = time.perf_counter()
+            message_content, end_call_detected, usage = await provider.complete_async(
+                messages, provider.config.end_call_enabled, attempts=attempts
+            )
+            turn = self._make_turn(speaker, message_content, end_call_detected, usage, time.perf_counter() - start)
+            if self.scheduler is not None:
+                self.scheduler.charge(provider.config.params.get("model"), turn.to_dict())
+            return turn
+        except Exception as e:
+            self._handle_error(speaker, e)
+            return None
+        finally:
+            if self.scheduler is not None:
+                self.scheduler.release_budget(reservation)
+            self._record_attempts(speaker, attempts)
+
+    def get_llm_response(self, provider: LLMProvider, speaker: str) -> Optional[str]:
+        """Returns the speaker's reply, or None if the provider failed after retries."""
+        turn = self.take_turn(provider, speaker)
+        return turn.content if turn is not None else None
+
+    async def get_llm_response_async(self, provider: LLMProvider, speaker: str) -> Optional[str]:
+        """Returns the speaker's reply, or None if the provider failed after retries."""
+        turn = await self.take_turn_async(provider, speaker)
+        return turn.content if turn is not None else None
+
+    def _release_providers(self) -> None:
+        # Providers are shared between conversations; let them drop state kept for ours
+        self.first_provider.end_conversation(self.perspective_messages[self.first_speaker])
+        self.second_provider.end_conversation(self.perspective_messages[self.second_speaker])
+
+    def _start_transcript(self):
+        self.started = True
+        self._transcript_cache = None
+
+    def _record_turn(self, speaker: str, turn: Optional[Turn]) -> bool:
+        """Append a turn to the turn log and the message views.
+        Returns True if the call was ended during this turn."""
+        if turn is None:
+            self.stop_reason = "error"
+            self.stopped_by = speaker
+            return True
+        self.turns.append(turn)
+        self._append_message(speaker, turn.content)
+        if not self.call_active:
+            self.stop_reason = "end_call"
+            self.stopped_by = speaker
+            return True
+        for detector in self.stop_detectors:
+            detail = detector.check(self, turn)
+            if detail is not None:
+                self.call_active = False
+                self.stop_reason = detector.reason
+                self.stopped_by = speaker
+                self.stop_detail = detail
+                return True
+        return False
 
     def have_conversation(self, max_turns):
-        # Start the transcript with conversation type
-        self.transcript = f"Starting {self.type} conversation\n\n"
-        self.transcript += f"{self.first_speaker}: {self.conversation_history[0]['content']}\n\n"
-        #print(self.transcript, end="")
+        self._start_transcript()
         
-        turn = 0
-        while self.call_active and turn < max_turns:
-            # Second speaker's turn
-            response1 = self.get_llm_response(self.second_provider, self.second_speaker)
-            self.conversation_history.append({"speaker": self.second_speaker, "content": response1})
-            self.transcript += f"{self.second_speaker}: {response1}\n\n"
-            #print(f"{self.second_speaker}: {response1}\n")
-            #time.sleep(0.2)
-            if not self.call_active:
-                end_message = f"Conversation ended via end_call() function by {self.second_speaker}."
-                self.transcript += end_message + "\n"
-                #print(end_message)
-                break
-
-            # First speaker's turn
-            response2 = self.get_llm_response(self.first_provider, self.first_speaker)
-            self.conversation_history.append({"speaker": self.first_speaker, "content": response2})
-            self.transcript += f"{self.first_speaker}: {response2}\n\n"
-            #print(f"{self.first_speaker}: {response2}\n")
-            #time.sleep(0.2)
-            if not self.call_active:
-                end_message = f"Conversation ended via end_call() function by {self.first_speaker}."
-                self.transcript += end_message + "\n"
-                #print(end_message)
-                break
-            
-            turn += 1
-            
+        try:
+            turn = 0
+            while self.call_active and turn < max_turns:
+                # Second speaker's turn
+                second_turn = self.take_turn(self.second_provider, self.second_speaker)
+                if self._record_turn(self.second_speaker, second_turn):
+                    break
+
+                # First speaker's turn
+                first_turn = self.take_turn(self.first_provider, self.first_speaker)
+                if self._record_turn(self.first_speaker, first_turn):
+                    break
+                
+                turn += 1
+        finally:
+            self._release_providers()
+        
+        if self.stop_reason is None:
+            self.stop_reason = "max_turns"
+        return self.transcript
+
+    async def have_conversation_async(self, max_turns):
+        """Async variant of have_conversation, so many conversations can be in flight on one event loop."""
+        self._start_transcript()
+        
+        try:
+            turn = 0
+            while self.call_active and turn < max_turns:
+                # Second speaker's turn
+                second_turn = await self.take_turn_async(self.second_provider, self.second_speaker)
+                if self._record_turn(self.second_speaker, second_turn):
+                    break
+
+                # First speaker's turn
+                first_turn = await self.take_turn_async(self.first_provider, self.first_speaker)
+                if self._record_turn(self.first_speaker, first_turn):
+                    break
+                
+                turn += 1
+        finally:
+            self._release_providers()
+        
+        if self.stop_reason is None:
+            self.stop_reason = "max_turns"
         return self.transcript
\ No newline at end of file
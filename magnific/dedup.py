@@ -0,0 +1,75 @@
+"""Near-duplicate detection for generated text with MinHash and locality-sensitive hashing.
+
+Each text becomes a set of word shingles (runs of consecutive words), and a MinHash
+signature estimates the Jaccard similarity of two such sets. Signatures are split
+into bands and only texts sharing a band are compared, so checking a new text
+costs about the same however many have been seen.
+"""
+import random
+import re
+import zlib
+from typing import Dict, List, Optional, Set, Tuple
+
+_WORD = re.compile(r"\w+")
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def shingles(text: str, size: int = 3) -> Set[int]:
+    """Hashes of the text's runs of size consecutive lowercased words (the whole text if shorter)."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+class MinHashDeduplicator:
+    """Remembers texts and rejects ones whose estimated Jaccard similarity to an earlier text
+    is at least threshold. With the default 16 bands of 4 rows, a pair with 0.7 similarity
+    shares a band (and so is compared) 99% of the time, and a pair with 0.3 about 12%."""
+    def __init__(self, threshold: float = 0.7, num_perm: int = 64, bands: int = 16, shingle_size: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self._permutations = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self._signatures: List[Tuple[int, ...]] = []
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        hashes = shingles(text, self.shingle_size)
+        return tuple(min((a * h + b) % _PRIME & _MAX_HASH for h in hashes) for a, b in self._permutations)
+
+    def _bands(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def is_duplicate(self, text: str) -> bool:
+        return self._find(self.signature(text)) is not None
+
+    def _find(self, signature: Tuple[int, ...]) -> Optional[int]:
+        checked = set()
+        for key in self._bands(signature):
+            for index in self._buckets.get(key, ()):
+                if index in checked:
+                    continue
+                checked.add(index)
+                other = self._signatures[index]
+                agreement = sum(x == y for x, y in zip(signature, other)) / len(signature)
+                if agreement >= self.threshold:
+                    return index
+        return None
+
+    def add(self, text: str) -> bool:
+        """Remember text and return True, or return False if it near-duplicates an earlier text."""
+        signature = self.signature(text)
+        if self._find(signature) is not None:
+            return False
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for key in self._bands(signature):
+            self._buckets.setdefault(key, []).append(index)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._signatures)
@@ -0,0 +1,149 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+from openai import OpenAI
+from magnific.clients import get_client
+from magnific.evaluators.evaluator import get_default_logs_dir
+from magnific.llm_config import RetryPolicy
+from magnific.retry import call_with_retry
+import json
+import os
+import uuid
+
+# Batch statuses after which no more output will appear
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+class BatchBackend(ABC):
+    """Submits a JSONL file of requests in the OpenAI Batch format and fetches the output.
+    Methods block; TestRunner calls them from a worker thread."""
+    @abstractmethod
+    def submit(self, input_path: Path) -> str:
+        """Submit the batch file and return a batch id"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """Return the batch status (validating, in_progress, completed, failed, ...)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def output_lines(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Return the parsed output lines of a completed batch"""
+        raise NotImplementedError
+
+class OpenAIBatchBackend(BatchBackend):
+    """Runs judge requests through the OpenAI Batch API (24h window, half price)."""
+    def __init__(self, client: Optional[OpenAI] = None, retry_policy: Optional[RetryPolicy] = None):
+        self.client = client or get_client(OpenAI, os.getenv("OPENAI_API_KEY") or "")
+        self.retry_policy = retry_policy or RetryPolicy()
+
+    def _upload(self, input_path: Path) -> Any:
+        with open(input_path, "rb") as f:
+            return self.client.files.create(file=f, purpose="batch")
+
+    def submit(self, input_path: Path) -> str:
+        input_file = call_with_retry(lambda: self._upload(input_path), self.retry_policy)
+        batch = call_with_retry(
+            lambda: self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            ),
+            self.retry_policy
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return call_with_retry(lambda: self.client.batches.retrieve(batch_id), self.retry_policy).status
+
+    def output_lines(self, batch_id: str) -> List[Dict[str, Any]]:
+        batch = call_with_retry(lambda: self.client.batches.retrieve(batch_id), self.retry_policy)
+        lines = []
+        # Requests that failed validation or execution land in the error file
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = call_with_retry(lambda: self.client.files.content(file_id), self.retry_policy).text
+                lines.extend(json.loads(line) for line in content.splitlines() if line.strip())
+        return lines
+
+class LocalBatchBackend(BatchBackend):
+    """Local stand-in for the Batch API.
+
+    Each request body is passed to handler, which must return a chat completion
+    as a dict. By default the request is sent to the regular chat completions
+    endpoint. Up to max_workers requests run at once, so handler must be
+    thread-safe. Output is written to work_dir in the Batch output format.
+    """
+    def __init__(
+        self,
+        handler: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        work_dir: Optional[Union[str, Path]] = None,
+        max_workers: int = 8,
+        retry_policy: Optional[RetryPolicy] = None
+    ):
+        self.handler = handler or self._default_handler
+        self.work_dir = Path(work_dir) if work_dir else get_default_logs_dir()
+        self.max_workers = max_workers
+        self.retry_policy = retry_policy or RetryPolicy()
+
+    def _output_path(self, batch_id: str) -> Path:
+        return self.work_dir / f"{batch_id}_output.jsonl"
+
+    def _default_handler(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        client = get_client(OpenAI, os.getenv("OPENAI_API_KEY") or "")
+        return call_with_retry(lambda: client.chat.completions.create(**body), self.retry_policy).model_dump()
+
+    def _run_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return {
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "body": self.handler(request["body"])},
+                "error": None
+            }
+        except Exception as e:
+            return {
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": request["custom_id"],
+                "response": None,
+                "error": {"message": str(e)}
+            }
+
+    def submit(self, input_path: Path) -> str:
+        input_path = Path(input_path)
+        batch_id = f"local_batch_{uuid.uuid4().hex}"
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        output_path = self._output_path(batch_id)
+        with input_path.open(encoding="utf-8") as infile:
+            requests = [json.loads(line) for line in infile if line.strip()]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor, output_path.open("w", encoding="utf-8") as outfile:
+            for output in executor.map(self._run_request, requests):
+                outfile.write(json.dumps(output) + "\n")
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        return "completed" if self._output_path(batch_id).exists() else "failed"
+
+    def output_lines(self, batch_id: str) -> List[Dict[str, Any]]:
+        with self._output_path(batch_id).open(encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+def write_batch_file(requests: List[Dict[str, Any]], path: Union[str, Path]) -> Path:
+    """Write batch requests as JSONL, one {"custom_id", "method", "url", "body"} per line."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+    return path
+
+def get_output_content(line: Dict[str, Any]) -> Optional[str]:
+    """Message content of one batch output line, or None if the request failed."""
+    response = line.get("response") or {}
+    if line.get("error") or response.get("status_code") != 200:
+        return None
+    try:
+        return response["body"]["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
@@ -1,23 +1,20 @@
 import os
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletionMessageParam
 from magnific.evaluators.evaluator import BaseEvaluator, EvaluationResponse, EvaluationResult
 import asyncio
 from magnific.conversation import LLMConversation
+from magnific.evaluation import Evaluation
+from magnific.llm_config import RetryPolicy
+from magnific.retry import call_with_retry_async
+from magnific.cache import SQLiteCache, hash_key
+from magnific.clients import get_async_client
+from magnific.evaluators.batch import get_output_content
+import hashlib
 import json
 
-class LlmEvaluator(BaseEvaluator):
-    def __init__(self, model: str = "gpt-4o"):
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY") or "")
-        self.model = model
-    
-    async def evaluate(self, conversation: LLMConversation) -> Optional[EvaluationResponse]:
-        """Evaluate a call locally."""
-        transcript = conversation.transcript
-        evaluations = conversation.evaluations
-        
-        system_prompt = """You are an evaluator. Your task is to analyze transcripts and provide structured evaluations.
+EVALUATOR_SYSTEM_PROMPT = """You are an evaluator. Your task is to analyze transcripts and provide structured evaluations.
 
 You must respond with ONLY a JSON object in the following format, with no additional text or explanation:
 {
@@ -33,44 +30,329 @@ Rules:
 4. Response must contain ONLY the JSON object - no other text
 5. JSON must use double quotes and exact key names as shown above"""
 
-        # Create all tasks at once
-        tasks = [
-            self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Evaluate this transcript for: {evaluation.prompt}\n\nTranscript:\n{transcript}"}
-                ],
-                temperature=0,
-                max_tokens=10000
+BATCH_EVALUATOR_SYSTEM_PROMPT = """You are an evaluator. Your task is to analyze a transcript against several criteria at once and provide a structured evaluation for each.
+
+Respond with a JSON object containing an "evaluations" array with exactly one entry per criterion:
+{
+    "evaluations": [
+        {
+            "name": "<criterion name exactly as given>",
+            "score": <float between 0.0 and 1.0>,
+            "passed": <true if score >= 0.7, false otherwise>,
+            "reason": "<detailed explanation for the score>"
+        }
+    ]
+}
+
+Rules:
+1. Judge every criterion independently of the others
+2. score must be a decimal number between 0.0 and 1.0 (1.0 is perfect, 0.0 is complete failure)
+3. passed must be a boolean (true/false) based on whether score >= 0.7
+4. reason must be a clear explanation justifying the score
+5. name must match the criterion name exactly"""
+
+def batch_response_format(names: List[str]) -> dict:
+    """Structured-output schema for one verdict per named criterion."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "evaluations",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "evaluations": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "name": {"type": "string", "enum": names},
+                                "score": {"type": "number"},
+                                "passed": {"type": "boolean"},
+                                "reason": {"type": "string"}
+                            },
+                            "required": ["name", "score", "passed", "reason"],
+                            "additionalProperties": False
+                        }
+                    }
+                },
+                "required": ["evaluations"],
+                "additionalProperties": False
+            }
+        }
+    }
+
+class LlmEvaluator(BaseEvaluator):
+    def __init__(
+        self,
+        model: str = "gpt-4o",
+        scheduler=None,
+        retry_policy: Optional[RetryPolicy] = None,
+        cache: Optional[SQLiteCache] = None,
+        batch_criteria: bool = False
+    ):
+        # Shared with every other evaluator on this event loop, so judge calls reuse warm connections
+        self.client = get_async_client(AsyncOpenAI, os.getenv("OPENAI_API_KEY") or "")
+        self.model = model
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Optional RequestScheduler so judge calls share the OpenAI quota with the agents
+        self.scheduler = scheduler
+        # Optional persistent cache of judge verdicts, so unchanged (transcript, criterion) pairs are not re-judged
+        self.cache = cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Tokens billed for judge calls made by this evaluator, for cost accounting
+        self.usage = {"input_tokens": 0, "output_tokens": 0, "cached_tokens": 0}
+        # Judge calls that failed after retries, as "<criterion>: <error>"
+        self.errors: List[str] = []
+        # Score all criteria of a conversation in one structured-output call
+        self.batch_criteria = batch_criteria
+
+    def _judge_messages(self, evaluation: Evaluation, transcript: str) -> List[dict]:
+        return [
+            {"role": "system", "content": EVALUATOR_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Evaluate this transcript for: {evaluation.prompt}\n\nTranscript:\n{transcript}"}
+        ]
+
+    async def _create_completion(self, messages: List[dict], **extra_params):
+        params = {"temperature": 0, "max_tokens": 10000, **extra_params}
+        reservation = None
+        if self.scheduler is not None:
+            reservation = self.scheduler.reserve_budget(self.model, messages, params)
+        try:
+            if self.scheduler is not None:
+                await self.scheduler.throttle("OpenAIProvider", self.model, messages, params)
+            response = await call_with_retry_async(
+                lambda: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    **params
+                ),
+                self.retry_policy
             )
-            for evaluation in evaluations
+        finally:
+            if self.scheduler is not None:
+                self.scheduler.release_budget(reservation)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            tokens = {
+                "input_tokens": usage.prompt_tokens or 0,
+                "output_tokens": usage.completion_tokens or 0,
+                "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0
+            }
+            for name, count in tokens.items():
+                self.usage[name] += count
+            if self.scheduler is not None:
+                self.scheduler.charge(self.model, tokens)
+        return response
+
+    def cache_key(self, evaluation: Evaluation, transcript: str, system_prompt: str = EVALUATOR_SYSTEM_PROMPT) -> str:
+        transcript_hash = hashlib.sha256(transcript.encode("utf-8")).hexdigest()
+        return hash_key(self.model, system_prompt, evaluation.prompt, transcript_hash)
+
+    async def _get_cached(self, evaluations: List[Evaluation], transcript: str) -> List[Optional[EvaluationResult]]:
+        """Cached verdict of each evaluation, or None, read in one lookup off the event loop.
+        Counts hits and misses."""
+        if self.cache is None:
+            return [None] * len(evaluations)
+        # Batched verdicts are cached under the batch prompt; either kind is a valid hit in batch mode
+        system_prompts = [BATCH_EVALUATOR_SYSTEM_PROMPT, EVALUATOR_SYSTEM_PROMPT] if self.batch_criteria else [EVALUATOR_SYSTEM_PROMPT]
+        keys = [[self.cache_key(evaluation, transcript, prompt) for prompt in system_prompts] for evaluation in evaluations]
+        found = await self.cache.get_many_async([key for evaluation_keys in keys for key in evaluation_keys])
+        results = []
+        for evaluation, evaluation_keys in zip(evaluations, keys):
+            cached = next((found[key] for key in evaluation_keys if key in found), None)
+            if cached is None:
+                self.cache_misses += 1
+                results.append(None)
+            else:
+                self.cache_hits += 1
+                results.append(EvaluationResult(name=evaluation.name, **cached))
+        return results
+
+    async def _store(self, verdicts: Dict[str, dict]) -> None:
+        """Write verdicts (cache key -> result) in one transaction, off the event loop."""
+        if self.cache is not None and verdicts:
+            await self.cache.set_many_async(verdicts)
+
+    def _parse_result(self, evaluation: Evaluation, content: Optional[str]) -> tuple[EvaluationResult, bool]:
+        """Returns the result and whether it was parsed successfully."""
+        try:
+            # Parse JSON from response
+            result_dict = json.loads(content)
+            # Create EvaluationResult with the evaluation name
+            return EvaluationResult(
+                name=evaluation.name,
+                score=float(result_dict["score"]),
+                passed=bool(result_dict["passed"]),
+                reason=str(result_dict["reason"])
+            ), True
+        except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
+            print(f"Error parsing evaluation result: {e}")
+            # Provide a default result if parsing fails
+            return EvaluationResult(
+                name=evaluation.name,
+                score=0.0,
+                passed=False,
+                reason=f"Failed to parse evaluation result: {str(e)}"
+            ), False
+    
+    async def evaluate(self, conversation: LLMConversation) -> Optional[EvaluationResponse]:
+        """Evaluate a call locally."""
+        return await self.evaluate_transcript(conversation.transcript, conversation.evaluations)
+
+    async def evaluate_transcript(self, transcript: str, evaluations: List[Evaluation]) -> EvaluationResponse:
+        """Evaluate a transcript, e.g. one loaded from a results log, against evaluations."""
+        results = await self._get_cached(evaluations, transcript)
+        pending = [i for i, result in enumerate(results) if result is None]
+        # New verdicts, written to the cache together once the transcript is judged
+        verdicts: Dict[str, dict] = {}
+
+        if self.batch_criteria and len(pending) > 1:
+            batched = await self._evaluate_batch([evaluations[i] for i in pending], transcript)
+            for i in pending:
+                if evaluations[i].name in batched:
+                    results[i] = batched.pop(evaluations[i].name)
+                    verdicts[self.cache_key(evaluations[i], transcript, BATCH_EVALUATOR_SYSTEM_PROMPT)] = results[i].dict(exclude={"name"})
+            # Anything the batch call dropped or mangled is judged on its own
+            pending = [i for i in pending if results[i] is None]
+
+        # Create tasks for every criterion that still needs a judge call
+        tasks = [
+            self._create_completion(self._judge_messages(evaluations[i], transcript))
+            for i in pending
         ]
         
-        # Run all tasks in parallel
-        responses = await asyncio.gather(*tasks)
+        # Run all tasks in parallel; one failed judge call must not abort the others
+        responses = await asyncio.gather(*tasks, return_exceptions=True)
         
-        results = []
-        for i, response in enumerate(responses):
-            try:
-                # Parse JSON from response
-                result_dict = json.loads(response.choices[0].message.content)
-                # Create EvaluationResult with the evaluation name
-                result = EvaluationResult(
-                    name=evaluations[i].name,
-                    score=float(result_dict["score"]),
-                    passed=bool(result_dict["passed"]),
-                    reason=str(result_dict["reason"])
-                )
-                results.append(result)
-            except (json.JSONDecodeError, KeyError, ValueError) as e:
-                print(f"Error parsing evaluation result: {e}")
-                # Provide a default result if parsing fails
-                results.append(EvaluationResult(
+        for i, response in zip(pending, responses):
+            if isinstance(response, BaseException):
+                if not isinstance(response, Exception):
+                    raise response
+                print(f"Error evaluating {evaluations[i].name}: {response}")
+                self.errors.append(f"{evaluations[i].name}: {response!r}")
+                results[i] = EvaluationResult(
                     name=evaluations[i].name,
                     score=0.0,
                     passed=False,
-                    reason=f"Failed to parse evaluation result: {str(e)}"
-                ))
+                    reason=f"Judge call failed: {response}"
+                )
+                continue
+            result, parsed = self._parse_result(evaluations[i], response.choices[0].message.content)
+            results[i] = result
+            # Only cache real verdicts; parse failures should be retried next run
+            if parsed:
+                verdicts[self.cache_key(evaluations[i], transcript)] = result.dict(exclude={"name"})
+        
+        await self._store(verdicts)
+        return EvaluationResponse(evaluation_results=results)
+
+    async def _evaluate_batch(self, evaluations: List[Evaluation], transcript: str) -> dict:
+        """Judge several criteria in one call.
+        Returns a {name: EvaluationResult} map holding only the criteria that came back valid."""
+        names = [evaluation.name for evaluation in evaluations]
+        # Duplicate names can't be told apart in one response, so leave them to per-criterion calls
+        unique = [evaluation for evaluation in evaluations if names.count(evaluation.name) == 1]
+        if len(unique) < 2:
+            return {}
+        criteria = "\n".join(f"- {evaluation.name}: {evaluation.prompt}" for evaluation in unique)
         
-        return EvaluationResponse(evaluation_results=results)
\ No newline at end of file
+        try:
+            response = await self._create_completion(
+                [
+                    {"role": "system", "content": BATCH_EVALUATOR_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Evaluate this transcript for each of these criteria:\n{criteria}\n\nTranscript:\n{transcript}"}
+                ],
+                response_format=batch_response_format([evaluation.name for evaluation in unique])
+            )
+            entries = json.loads(response.choices[0].message.content)["evaluations"]
+        except Exception as e:
+            print(f"Error in batched evaluation, falling back to per-criterion calls: {e}")
+            return {}
+        
+        expected = {evaluation.name for evaluation in unique}
+        results = {}
+        for entry in entries:
+            try:
+                name = str(entry["name"])
+                if name not in expected or name in results:
+                    continue
+                results[name] = EvaluationResult(
+                    name=name,
+                    score=float(entry["score"]),
+                    passed=bool(entry["passed"]),
+                    reason=str(entry["reason"])
+                )
+            except (KeyError, ValueError, TypeError):
+                continue
+        return results
+
+    async def build_batch_requests(self, conversation: LLMConversation, test_id: Any) -> tuple[List[dict], dict]:
+        """Judge requests for one test in the OpenAI Batch format, for deferred evaluation.
+
+        Returns (requests, entry) where entry records, per custom_id, which criterion
+        it scores, plus any verdicts already available from the cache.
+        """
+        return await self.build_transcript_batch_requests(conversation.transcript, conversation.evaluations, test_id)
+
+    async def build_transcript_batch_requests(
+        self,
+        transcript: str,
+        evaluations: List[Evaluation],
+        test_id: Any
+    ) -> tuple[List[dict], dict]:
+        """build_batch_requests for a transcript, e.g. one loaded from a results log."""
+        requests = []
+        entry = {"names": [], "cached": {}, "requests": {}}
+        cached_results = await self._get_cached(evaluations, transcript)
+        for i, (evaluation, cached) in enumerate(zip(evaluations, cached_results)):
+            entry["names"].append(evaluation.name)
+            if cached is not None:
+                entry["cached"][i] = cached.dict()
+                continue
+            custom_id = f"{test_id}:{i}"
+            requests.append({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": self._judge_messages(evaluation, transcript),
+                    "temperature": 0,
+                    "max_tokens": 10000
+                }
+            })
+            entry["requests"][custom_id] = {
+                "index": i,
+                "cache_key": self.cache_key(evaluation, transcript)
+            }
+        return requests, entry
+
+    async def parse_batch_output(self, entry: dict, output_lines: dict) -> EvaluationResponse:
+        """Merge batch output (keyed by custom_id) and cached verdicts into one test's EvaluationResponse."""
+        results = [None] * len(entry["names"])
+        verdicts: Dict[str, dict] = {}
+        for i, cached in entry["cached"].items():
+            results[int(i)] = EvaluationResult(**cached)
+        for custom_id, request in entry["requests"].items():
+            index = request["index"]
+            name = entry["names"][index]
+            line = output_lines.get(custom_id)
+            content = get_output_content(line) if line else None
+            if content is None:
+                error = (line or {}).get("error") or "missing from batch output"
+                results[index] = EvaluationResult(
+                    name=name,
+                    score=0.0,
+                    passed=False,
+                    reason=f"Batch evaluation request failed: {error}"
+                )
+                continue
+            result, parsed = self._parse_result(Evaluation(name=name, prompt=""), content)
+            results[index] = result
+            if parsed:
+                verdicts[request["cache_key"]] = result.dict(exclude={"name"})
+        await self._store(verdicts)
+        return EvaluationResponse(evaluation_results=results)
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Union
 from openai.types.chat import ChatCompletionMessageParam
 from pydantic import BaseModel, Field
 from dataclasses import dataclass
@@ -128,6 +128,7 @@ def save_test_details_to_json(
 def save_run_details_to_json(
     test_results: Dict[str, Dict],
     logs_dir: Optional[Union[str, Path]] = None,
+    summary: Optional[Dict[str, Any]] = None,
 ) -> Path:
     """
     Save all test results from a single run to one JSON file.
@@ -143,8 +144,200 @@ def save_run_details_to_json(
         'timestamp': timestamp,
         'tests': test_results
     }
+    if summary:
+        run_data['summary'] = summary
     
     with output_file.open('w', encoding='utf-8') as f:
         json.dump(run_data, f, indent=2)
     
-    return output_file
\ No newline at end of file
+    return output_file
+
+class ResultSink:
+    """
+    Stream test results to disk as each test completes.
+    
+    Every result is appended to a JSONL file and a CSV file and flushed right away,
+    so a crashed or killed run keeps everything finished so far. The CSV header is
+    fixed up front from the evaluation names of the whole run, so every row lines up
+    with the same Score_<name> columns. An existing CSV whose header differs (a resumed
+    run with other evaluations) is rewritten from the JSONL before appending. close()
+    rewrites the CSV and writes the usual run_details JSON by streaming the JSONL back
+    in, which keeps memory flat.
+    """
+    def __init__(
+        self,
+        logs_dir: Optional[Union[str, Path]] = None,
+        evaluation_names: Optional[List[str]] = None,
+        timestamp: Optional[str] = None
+    ):
+        self.logs_path = Path(logs_dir) if logs_dir else get_default_logs_dir()
+        self.logs_path.mkdir(parents=True, exist_ok=True)
+        self.timestamp = timestamp or datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self.jsonl_path = self.logs_path / f"run_results_{self.timestamp}.jsonl"
+        self.csv_path = self.logs_path / f"evaluation_results_{self.timestamp}.csv"
+        
+        # Keep first-seen order and drop duplicates
+        self.evaluation_names = list(dict.fromkeys(evaluation_names or []))
+        self.fieldnames = CSV_COLUMNS + [f'Score_{name}' for name in self.evaluation_names]
+        
+        self._jsonl_file = self.jsonl_path.open('a', encoding='utf-8')
+        # A killed run can leave a partial last line; start ours on a fresh one
+        if self._jsonl_file.tell() > 0:
+            with self.jsonl_path.open('rb') as f:
+                f.seek(-1, 2)
+                if f.read(1) != b"\n":
+                    self._jsonl_file.write("\n")
+        header = _read_csv_header(self.csv_path)
+        if header is not None and header != self.fieldnames:
+            # Rows already in the file were written under other columns; rebuild it from the log
+            # with the union of both column sets so old and new rows line up
+            self.evaluation_names = list(dict.fromkeys(_score_names(header) + self.evaluation_names))
+            write_csv_from_jsonl(self.jsonl_path, self.csv_path, evaluation_names=self.evaluation_names)
+            self.fieldnames = _read_csv_header(self.csv_path)
+        self._csv_file = self.csv_path.open('a', newline='', encoding='utf-8')
+        self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=self.fieldnames, restval='', extrasaction='ignore')
+        if header is None:
+            self._csv_writer.writeheader()
+            self._csv_file.flush()
+        self.count = 0
+
+    def write(self, result: Dict[str, Any]) -> None:
+        """Append one TestResult dict to the JSONL and CSV outputs."""
+        self._jsonl_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self._jsonl_file.flush()
+        
+        self._csv_writer.writerow(_csv_row(result))
+        self._csv_file.flush()
+        self.count += 1
+
+    def close(self, summary: Optional[Dict[str, Any]] = None) -> Path:
+        """Close the streams and rewrite the CSV and run_details_<timestamp>.json from the JSONL log."""
+        self._jsonl_file.close()
+        self._csv_file.close()
+        # One row per test; drops rows superseded by a rerun on resume
+        write_csv_from_jsonl(self.jsonl_path, self.csv_path, evaluation_names=self.evaluation_names)
+        return write_run_details_from_jsonl(
+            self.jsonl_path,
+            self.logs_path / f"run_details_{self.timestamp}.json",
+            timestamp=self.timestamp,
+            summary=summary
+        )
+
+CSV_COLUMNS = ['Test_ID', 'Type', 'Name', 'Transcript']
+
+def _csv_row(result: Dict[str, Any]) -> Dict[str, Any]:
+    row_data = {
+        'Test_ID': result['test_id'],
+        'Type': 'LLM',
+        'Name': result['service_config']['params'].get('model', 'unknown'),
+        'Transcript': result['transcript'],
+    }
+    for evaluation_result in result['evaluation_results']:
+        row_data[f"Score_{evaluation_result['name']}"] = evaluation_result['score']
+    return row_data
+
+def _read_csv_header(path: Path) -> Optional[List[str]]:
+    # None when there is no CSV yet (or it is empty), so the caller writes the header
+    if not path.exists():
+        return None
+    with path.open(newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), None)
+
+def _score_names(fieldnames: List[str]) -> List[str]:
+    return [column[len('Score_'):] for column in fieldnames if column.startswith('Score_')]
+
+def iter_latest_results(jsonl_path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """
+    Each test's last entry in a JSONL results log, in log order, one at a time.
+    A log continued by resume_from or by deferred judging can hold a test more than once.
+    """
+    with Path(jsonl_path).open(encoding='utf-8') as infile:
+        # First pass: the line number of each test's last entry, so results needn't be held in memory
+        last_entry = {str(result['test_id']): index for index, result in enumerate(_iter_jsonl(infile))}
+    with Path(jsonl_path).open(encoding='utf-8') as infile:
+        for index, result in enumerate(_iter_jsonl(infile)):
+            if last_entry[str(result['test_id'])] == index:
+                yield result
+
+def write_csv_from_jsonl(
+    jsonl_path: Union[str, Path],
+    output_file: Union[str, Path],
+    evaluation_names: Optional[List[str]] = None
+) -> Path:
+    """
+    Write the evaluation_results CSV for a JSONL results log, one row per test (its last entry)
+    and one Score_<name> column for each of evaluation_names and every other evaluation name in the log.
+    """
+    output_file = Path(output_file)
+    names = dict.fromkeys(evaluation_names or [])
+    names.update(dict.fromkeys(
+        evaluation_result['name']
+        for result in iter_latest_results(jsonl_path)
+        for evaluation_result in result['evaluation_results']
+    ))
+    with output_file.open('w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS + [f'Score_{name}' for name in names], restval='')
+        writer.writeheader()
+        for result in iter_latest_results(jsonl_path):
+            writer.writerow(_csv_row(result))
+    return output_file
+
+def rebuild_run_outputs(jsonl_path: Union[str, Path], summary: Optional[Dict[str, Any]] = None) -> Path:
+    """
+    Rewrite the CSV and run_details JSON next to a run_results_<timestamp>.jsonl log from the log,
+    e.g. after entries were appended to it. Returns the run_details path.
+    """
+    jsonl_path = Path(jsonl_path)
+    timestamp = jsonl_path.stem[len("run_results_"):]
+    write_csv_from_jsonl(jsonl_path, jsonl_path.parent / f"evaluation_results_{timestamp}.csv")
+    return write_run_details_from_jsonl(
+        jsonl_path,
+        jsonl_path.parent / f"run_details_{timestamp}.json",
+        timestamp=timestamp,
+        summary=summary
+    )
+
+def write_run_details_from_jsonl(
+    jsonl_path: Union[str, Path],
+    output_file: Union[str, Path],
+    timestamp: Optional[str] = None,
+    summary: Optional[Dict[str, Any]] = None,
+) -> Path:
+    """
+    Convert a JSONL results log into the run_details JSON layout, one test at a time.
+    A log continued by resume_from can hold a test more than once; only its last entry is kept.
+    """
+    output_file = Path(output_file)
+    timestamp = timestamp or datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    with output_file.open('w', encoding='utf-8') as f:
+        f.write('{\n  "timestamp": ' + json.dumps(timestamp) + ',\n  "tests": {')
+        first = True
+        for result in iter_latest_results(jsonl_path):
+            f.write(('' if first else ',') + '\n    ' + json.dumps(str(result['test_id'])) + ': ' + json.dumps(result))
+            first = False
+        f.write('\n  }' if not first else '}')
+        if summary:
+            f.write(',\n  "summary": ' + json.dumps(summary))
+        f.write('\n}\n')
+    return output_file
+
+def _iter_jsonl(lines):
+    # Skip blank lines and lines cut short by a crash
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+def load_run_results(path: Union[str, Path]) -> List[Dict[str, Any]]:
+    """
+    Load test results from a run_results JSONL log or a run_details JSON file.
+    A test logged more than once (rerun on resume) is returned once, as its last entry.
+    """
+    path = Path(path)
+    if path.suffix == '.jsonl':
+        return list(iter_latest_results(path))
+    with path.open(encoding='utf-8') as f:
+        return list(json.load(f)['tests'].values())
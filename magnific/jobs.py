@@ -0,0 +1,396 @@
+"""Persistent job queue for the API server.
+
+Jobs (such as reruns) are stored in a local SQLite file together with every
+event they publish, so they survive server restarts and can be inspected from
+any process. Worker processes claim queued jobs oldest first, skipping users who
+already have max_jobs_per_user jobs running, and run them on their own event
+loop. The API only enqueues, cancels and reads jobs, so large suites never block
+request handling.
+
+Clients poll a job's state or follow its event stream. Events are numbered, so
+a subscriber that connects late or reconnects still sees the whole run.
+
+A worker refreshes the heartbeat of the job it runs every few seconds. A running
+job is only put back in the queue once its worker is gone: its process no longer
+exists on this machine, or its heartbeat is older than STALE_AFTER seconds.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+TERMINAL_JOB_STATUSES = {"completed", "failed", "cancelled"}
+
+# Seconds between heartbeats of a running job, and without one before its worker counts as gone
+HEARTBEAT_INTERVAL = 5.0
+STALE_AFTER = 60.0
+
+def get_default_queue_path() -> Path:
+    """Get the default job queue file (~/.cache/magnific/jobs.sqlite)."""
+    return Path.home() / ".cache" / "magnific" / "jobs.sqlite"
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    user: str
+    status: str  # queued -> running -> completed | failed | cancelled
+    total: int
+    completed: int
+    cancel_requested: bool
+    error: Optional[str]
+    worker: Optional[str]
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    heartbeat_at: Optional[float]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "user": self.user,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "cancel_requested": self.cancel_requested,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "heartbeat_at": self.heartbeat_at,
+        }
+
+_JOB_COLUMNS = (
+    "id, kind, user, status, total, completed, cancel_requested, error, worker, created_at, started_at, finished_at, heartbeat_at"
+)
+
+def _job(row: tuple) -> Job:
+    job = Job(*row)
+    job.cancel_requested = bool(job.cancel_requested)
+    return job
+
+def _this_host() -> str:
+    return os.uname().nodename
+
+def _worker_alive(worker: Optional[str]) -> Optional[bool]:
+    """Whether a worker ("host:pid") is still running, or None if it runs on another machine."""
+    host, _, pid = (worker or "").rpartition(":")
+    if host != _this_host() or not pid.isdigit():
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, but belongs to another user
+    return True
+
+class JobQueue:
+    """SQLite-backed queue of jobs and their events, shared by the API and worker processes."""
+    def __init__(self, path: Optional[Union[str, Path]] = None, keep_finished: int = 1000):
+        self.path = Path(path) if path else get_default_queue_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.keep_finished = keep_finished
+        self._lock = threading.Lock()
+        # Autocommit mode; multi-statement updates open their own transactions
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                user TEXT NOT NULL,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                completed INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                worker TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                payload BLOB NOT NULL,
+                heartbeat_at REAL
+            )"""
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "heartbeat_at" not in columns:
+            # Queue files created before heartbeats were recorded
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created_at)")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                event TEXT NOT NULL,
+                data TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq)")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent workers serialize here
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _select_job(self, job_id: str) -> Optional[Job]:
+        row = self._conn.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def _publish(self, job_id: str, event: str, data: Dict[str, Any]) -> None:
+        self._conn.execute(
+            "INSERT INTO job_events (job_id, event, data) VALUES (?, ?, ?)",
+            (job_id, event, json.dumps(data, ensure_ascii=False))
+        )
+
+    def submit(self, kind: str, payload: Dict[str, Any], total: int, user: str = "anonymous") -> Job:
+        """Queue a job and return it. payload is pickled and handed to the worker that runs it."""
+        job_id = uuid.uuid4().hex
+        with self._transaction():
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, user, status, total, created_at, payload) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, user, total, time.time(), pickle.dumps(payload))
+            )
+            self._prune()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._select_job(job_id)
+
+    def list(self, user: Optional[str] = None, limit: int = 100) -> List[Job]:
+        """Most recent jobs first, optionally only those of one user."""
+        query = f"SELECT {_JOB_COLUMNS} FROM jobs"
+        params: tuple = ()
+        if user is not None:
+            query += " WHERE user = ?"
+            params = (user,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY created_at DESC LIMIT ?", params + (limit,)).fetchall()
+        return [_job(row) for row in rows]
+
+    def payload(self, job_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return pickle.loads(row[0])
+
+    def results(self, job_id: str) -> Dict[str, Any]:
+        """Results published so far, keyed by test ID. A test run twice keeps its last result."""
+        results = {}
+        for event in self.events(job_id):
+            if event["event"] == "result":
+                results[str(event["data"]["test_id"])] = event["data"]["result"]
+        return results
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """Events of a job with a sequence number greater than after, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, event, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after)
+            ).fetchall()
+        return [{"seq": seq, "event": event, "data": json.loads(data)} for seq, event, data in rows]
+
+    def claim(self, worker: str, max_jobs_per_user: Optional[int] = None) -> Optional[Job]:
+        """Mark the oldest runnable job as running by worker and return it, or None if there is none."""
+        limit = max_jobs_per_user if max_jobs_per_user is not None else -1
+        with self._transaction():
+            row = self._conn.execute(
+                """SELECT id FROM jobs AS queued
+                WHERE status = 'queued' AND cancel_requested = 0 AND (
+                    ? < 0 OR (SELECT COUNT(*) FROM jobs WHERE user = queued.user AND status = 'running') < ?
+                )
+                ORDER BY created_at LIMIT 1""",
+                (limit, limit)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ? WHERE id = ?",
+                (worker, now, now, row[0])
+            )
+            self._publish(row[0], "status", {"status": "running"})
+            return self._select_job(row[0])
+
+    def heartbeat(self, job_id: str, worker: str) -> None:
+        """Record that worker is still running job_id."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), job_id, worker)
+            )
+
+    def add_result(self, job_id: str, test_id: Any, result: Dict[str, Any]) -> None:
+        with self._transaction():
+            self._conn.execute("UPDATE jobs SET completed = completed + 1 WHERE id = ?", (job_id,))
+            job = self._select_job(job_id)
+            self._publish(job_id, "result", {"test_id": test_id, "completed": job.completed, "total": job.total, "result": result})
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, error, time.time(), job_id)
+        )
+        self._publish(job_id, "done", self._select_job(job_id).to_dict())
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._transaction():
+            self._finish(job_id, status, error)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job. A queued job is cancelled at once; a running one is stopped by its worker,
+        keeping the results it already published. Returns None for an unknown job."""
+        with self._transaction():
+            job = self._select_job(job_id)
+            if job is None or job.status in TERMINAL_JOB_STATUSES:
+                return job
+            self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            if job.status == "queued":
+                self._finish(job_id, "cancelled")
+            return self._select_job(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def requeue_running(self, stale_after: float = STALE_AFTER) -> int:
+        """Put running jobs whose worker is gone (e.g. killed by a server restart) back in the queue.
+        A worker is gone when its process no longer exists on this machine, or it has sent no
+        heartbeat for stale_after seconds. Safe to call while other workers are running.
+        Such jobs that were asked to cancel are marked cancelled instead, since claim skips them.
+        Returns the number of jobs requeued."""
+        now = time.time()
+        requeued = 0
+        with self._transaction():
+            rows = self._conn.execute(
+                "SELECT id, worker, COALESCE(heartbeat_at, started_at), cancel_requested FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            for job_id, worker, last_seen, cancel_requested in rows:
+                if _worker_alive(worker) is not False and now - (last_seen or 0) < stale_after:
+                    continue
+                if cancel_requested:
+                    self._finish(job_id, "cancelled")
+                    continue
+                self._conn.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ?", (job_id,))
+                self._publish(job_id, "status", {"status": "queued"})
+                requeued += 1
+        return requeued
+
+    def _prune(self) -> None:
+        old = self._conn.execute(
+            f"""SELECT id FROM jobs WHERE status IN ({', '.join('?' * len(TERMINAL_JOB_STATUSES))})
+            ORDER BY finished_at DESC LIMIT -1 OFFSET ?""",
+            (*TERMINAL_JOB_STATUSES, self.keep_finished)
+        ).fetchall()
+        for (job_id,) in old:
+            self._conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+async def _run_rerun(queue: JobQueue, job: Job, cancel_poll_interval: float) -> None:
+    from magnific.conversation import LLMConversation
+    from magnific.test_runner import TestRunner
+
+    payload = queue.payload(job.id)
+    # A requeued job only runs the tests that have no result yet
+    done = set(queue.results(job.id))
+    pending = [
+        (test_id, spec) for test_id, spec in zip(payload["test_ids"], payload["conversations"])
+        if str(test_id) not in done
+    ]
+    runner = TestRunner(**payload["runner_options"])
+    run = asyncio.create_task(runner.run_tests(
+        conversations=[LLMConversation.from_spec(spec) for _, spec in pending],
+        max_turns=payload["max_turns"],
+        keep_results=False,
+        test_ids=[test_id for test_id, _ in pending],
+        result_callback=lambda result: queue.add_result(job.id, result["test_id"], result)
+    ))
+    while not run.done():
+        await asyncio.wait({run}, timeout=cancel_poll_interval)
+        if not run.done() and queue.cancel_requested(job.id):
+            run.cancel()
+    await run
+
+JOB_HANDLERS = {"rerun": _run_rerun}
+
+def run_job(queue: JobQueue, job: Job, cancel_poll_interval: float = 1.0) -> None:
+    """Run a claimed job to completion on a fresh event loop and record how it ended."""
+    # Heartbeats come from a thread, so a job busy on its event loop still shows its worker is alive
+    done = threading.Event()
+    def beat() -> None:
+        while not done.wait(HEARTBEAT_INTERVAL):
+            queue.heartbeat(job.id, job.worker)
+    threading.Thread(target=beat, daemon=True).start()
+    try:
+        asyncio.run(JOB_HANDLERS[job.kind](queue, job, cancel_poll_interval))
+    except asyncio.CancelledError:
+        queue.finish(job.id, "cancelled")
+    except Exception as e:
+        import traceback
+        print(f"Error in {job.kind} job {job.id}: {str(e)}")
+        print(traceback.format_exc())
+        queue.finish(job.id, "failed", str(e))
+    else:
+        queue.finish(job.id, "completed")
+    finally:
+        done.set()
+
+def run_worker(
+    path: Optional[Union[str, Path]] = None,
+    max_jobs_per_user: Optional[int] = None,
+    poll_interval: float = 1.0,
+    stop: Optional[Any] = None
+) -> None:
+    """Claim and run jobs one at a time until stop (a threading or multiprocessing Event) is set.
+    While idle, the worker also requeues jobs whose worker is gone."""
+    queue = JobQueue(path)
+    worker = f"{_this_host()}:{os.getpid()}"
+    while stop is None or not stop.is_set():
+        job = queue.claim(worker, max_jobs_per_user)
+        if job is None:
+            queue.requeue_running()
+            time.sleep(poll_interval)
+            continue
+        run_job(queue, job)
+
+def start_workers(
+    num_workers: int,
+    path: Optional[Union[str, Path]] = None,
+    max_jobs_per_user: Optional[int] = None
+) -> List[multiprocessing.Process]:
+    """Start num_workers worker processes and return them."""
+    # Spawn rather than fork: workers must not inherit the server's event loop or sockets
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for _ in range(num_workers):
+        process = context.Process(
+            target=run_worker,
+            args=(str(path) if path else None, max_jobs_per_user),
+            daemon=True
+        )
+        process.start()
+        workers.append(process)
+    return workers
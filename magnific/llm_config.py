@@ -1,9 +1,32 @@
 from dataclasses import dataclass, field
-from typing import Dict
+from typing import Dict, Optional
+
+@dataclass
+class RateLimit:
+    """Vendor quota for a provider/model pair. None means unlimited."""
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+
+@dataclass
+class RetryPolicy:
+    """How providers retry transient failures (rate limits, timeouts, 5xx)."""
+    max_attempts: int = 5
+    base_delay: float = 1.0  # seconds, doubled on each attempt
+    max_delay: float = 30.0
+    max_retry_after: float = 120.0  # upper bound on server-requested waits
+    jitter: bool = True
 
 @dataclass
 class LLMConfig:
     """Base configuration class for LLM providers"""
     system_prompt: str
     params: Dict = field(default_factory=dict)
-    end_call_enabled: bool = False 
\ No newline at end of file
+    end_call_enabled: bool = False
+    rate_limit: Optional[RateLimit] = None
+    retry_policy: RetryPolicy = field(default_factory=RetryPolicy)
+    # Stream responses to measure time-to-first-token and gaps between chunks
+    stream: bool = False
+    # When streaming, stop reading as soon as end_call appears (skips the rest of the reply)
+    stop_on_end_call: bool = False
+    # Anthropic only: mark the tools, system prompt and conversation prefix for prompt caching
+    prompt_caching: bool = False
@@ -1,13 +1,40 @@
-from openai import OpenAI
-from anthropic import Anthropic
-from groq import Groq
-from cerebras.cloud.sdk import Cerebras
+from openai import OpenAI, AsyncOpenAI
+from anthropic import Anthropic, AsyncAnthropic
+from groq import Groq, AsyncGroq
+from cerebras.cloud.sdk import Cerebras, AsyncCerebras
 from google import genai
 from google.genai import types
 from typing import List, Dict, Optional
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import asyncio
 import os
-from magnific.llm_config import LLMConfig
+import threading
+from magnific.llm_config import LLMConfig, RetryPolicy
+from magnific.retry import AttemptRecord, call_with_retry, call_with_retry_async
+from magnific.usage import Usage
+from magnific.clients import get_client, get_async_client
+
+class StreamState:
+    """Text and end_call detection accumulated from a streamed response."""
+    def __init__(self, usage: Usage):
+        self.usage = usage
+        self.parts: List[str] = []
+        self.end_call_detected = False
+
+    def add_text(self, text: Optional[str]) -> None:
+        if text:
+            self.usage.mark_token()
+            self.parts.append(text)
+
+    def add_end_call(self) -> None:
+        self.usage.mark_token()
+        self.end_call_detected = True
+
+    @property
+    def content(self) -> Optional[str]:
+        return "".join(self.parts) if self.parts else None
 
 class LLMProvider(ABC):
     @abstractmethod
@@ -16,6 +43,146 @@ class LLMProvider(ABC):
         Returns: (message_content, tool_call)"""
         pass
 
+    async def get_completion_async(self, messages: List[Dict], end_call_enabled: bool = True, tools: Optional[List[Dict]] = None) -> tuple[str, Optional[Dict]]:
+        """Async variant of get_completion.
+        Providers with a native async client override this; the default runs
+        the blocking call in a worker thread so it never stalls the event loop."""
+        return await asyncio.to_thread(self.get_completion, messages, end_call_enabled, tools)
+
+    def get_completion_with_usage(self, messages: List[Dict], end_call_enabled: bool = True, tools: Optional[List[Dict]] = None) -> tuple[str, Optional[Dict], Usage]:
+        """get_completion plus a Usage record of timing and tokens.
+        The default only measures time; built-in providers also report token counts."""
+        usage = Usage.begin()
+        message_content, end_call_detected = self.get_completion(messages, end_call_enabled, tools)
+        return message_content, end_call_detected, usage.end()
+
+    async def get_completion_with_usage_async(self, messages: List[Dict], end_call_enabled: bool = True, tools: Optional[List[Dict]] = None) -> tuple[str, Optional[Dict], Usage]:
+        """Async variant of get_completion_with_usage."""
+        usage = Usage.begin()
+        message_content, end_call_detected = await self.get_completion_async(messages, end_call_enabled, tools)
+        return message_content, end_call_detected, usage.end()
+
+    def end_conversation(self, messages: List[Dict]) -> None:
+        """Called once the conversation that owns messages is over.
+        Providers that keep per-conversation state drop it here; the default keeps none."""
+
+    def to_spec(self) -> Dict:
+        """Picklable description used to rebuild this provider in another process.
+        Clients hold sockets and locks, so they are recreated rather than copied."""
+        return {"class": type(self), "config": self.config}
+
+    @classmethod
+    def from_spec(cls, spec: Dict) -> "LLMProvider":
+        # Conversations rebuilt from specs share built-in providers with identical configs
+        from magnific.provider_registry import get_provider
+        return get_provider(spec["class"], spec["config"])
+
+    @property
+    def name(self) -> str:
+        """Provider name used for rate-limit and cache lookups."""
+        return type(self).__name__
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return getattr(self.config, "retry_policy", None) or RetryPolicy()
+
+    # (client class, api key, base URL) of the vendor's async SDK client, set by providers
+    # that talk to it directly; the client itself is shared and scoped to the running loop
+    async_client_spec: Optional[tuple] = None
+
+    @property
+    def async_client(self):
+        return get_async_client(*self.async_client_spec)
+
+    def _end_call_tool(self):
+        """The vendor-specific end_call tool definition."""
+        raise NotImplementedError
+
+    def _tools_for(self, end_call_enabled: bool, tools: Optional[List] = None) -> tuple:
+        """Final tool payload for a request, built once per (end_call_enabled, tools list) and reused.
+        The payload is shared between calls and must not be modified; pass a new list when tools change."""
+        payloads = self.__dict__.setdefault("_tool_payloads", {})
+        key = (end_call_enabled, id(tools))
+        cached = payloads.get(key)
+        if cached is None or cached[0] is not tools:
+            payload = tuple(tools or ()) + ((self._end_call_tool(),) if end_call_enabled else ())
+            payloads[key] = cached = (tools, payload)
+        return cached[1]
+
+    @property
+    def streaming(self) -> bool:
+        return getattr(self.config, "stream", False)
+
+    def _read_chunk(self, chunk, state: StreamState) -> None:
+        """Fold one streamed chunk into state. Implemented by providers that support streaming."""
+        raise NotImplementedError(f"{self.name} does not support streaming")
+
+    def _stop_early(self, state: StreamState) -> bool:
+        return state.end_call_detected and getattr(self.config, "stop_on_end_call", False)
+
+    def _consume_stream(self, stream, usage: Usage) -> tuple[Optional[str], bool, Usage]:
+        state = StreamState(usage)
+        try:
+            for chunk in stream:
+                self._read_chunk(chunk, state)
+                if self._stop_early(state):
+                    break
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        return state.content, state.end_call_detected, usage.end()
+
+    async def _consume_stream_async(self, stream, usage: Usage) -> tuple[Optional[str], bool, Usage]:
+        state = StreamState(usage)
+        try:
+            async for chunk in stream:
+                self._read_chunk(chunk, state)
+                if self._stop_early(state):
+                    break
+        finally:
+            # SDK streams expose an async close(); plain async generators have aclose()
+            close = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+            if close is not None:
+                await close()
+        return state.content, state.end_call_detected, usage.end()
+
+    def complete(
+            self,
+            messages: List[Dict],
+            end_call_enabled: bool = True,
+            tools: Optional[List[Dict]] = None,
+            attempts: Optional[List[AttemptRecord]] = None
+    ) -> tuple[str, Optional[Dict], Usage]:
+        """get_completion_with_usage with retries on transient errors; fatal errors are raised immediately."""
+        return call_with_retry(
+            lambda: self.get_completion_with_usage(messages, end_call_enabled, tools),
+            self.retry_policy,
+            attempts
+        )
+
+    async def complete_async(
+            self,
+            messages: List[Dict],
+            end_call_enabled: bool = True,
+            tools: Optional[List[Dict]] = None,
+            attempts: Optional[List[AttemptRecord]] = None
+    ) -> tuple[str, Optional[Dict], Usage]:
+        """get_completion_with_usage_async with retries on transient errors; fatal errors are raised immediately."""
+        return await call_with_retry_async(
+            lambda: self.get_completion_with_usage_async(messages, end_call_enabled, tools),
+            self.retry_policy,
+            attempts
+        )
+
+END_CALL_DESCRIPTION = "Ends the conversation by deactivating the active call."
+
+# How OpenAI-compatible vendors differ in tool calling
+TOOL_DIALECTS = {
+    "openai": {"strict": True, "tool_choice": None},
+    "xai": {"strict": False, "tool_choice": "auto"},
+}
+
 class OpenAIProvider(LLMProvider):
     #The following models are supported:
     #gpt-4o
@@ -24,43 +191,50 @@ class OpenAIProvider(LLMProvider):
     #o1
     #o1-mini
     #o3-mini
+    # Whether the endpoint accepts stream_options to report usage on the final chunk
+    stream_usage_option = True
+    # Key into TOOL_DIALECTS
+    tool_dialect = "openai"
+
     def __init__(self, config: LLMConfig):
-        self.client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+        self.client = get_client(OpenAI, os.environ["OPENAI_API_KEY"])
+        self.async_client_spec = (AsyncOpenAI, os.environ["OPENAI_API_KEY"])
         self.config = config
-        
-    def get_completion(
+
+    def _end_call_tool(self) -> Dict:
+        return {
+            "type": "function",
+            "function": {
+                "name": "end_call",
+                "description": END_CALL_DESCRIPTION,
+                "parameters": {
+                    "type": "object",
+                    "properties": {},
+                    "additionalProperties": False
+                },
+                "strict": TOOL_DIALECTS[self.tool_dialect]["strict"]
+            }
+        }
+
+    def _build_params(
             self,
             messages: List[Dict],
             end_call_enabled: bool = True,
             tools: Optional[List[Dict]] = None
-    ) -> tuple[str, Optional[Dict]]:
-        # Create a new tools list for this call
-        current_tools = [] if tools is None else tools.copy()
-        
+    ) -> Dict:
         params = {
             "messages": messages,
             **self.config.params
         }
-        
-        if end_call_enabled:
-            current_tools.append({
-                "type": "function",
-                "function": {
-                    "name": "end_call",
-                    "description": "Ends the conversation by deactivating the active call.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {},
-                        "additionalProperties": False
-                    },
-                    "strict": True
-                }
-            })
-            
+        current_tools = self._tools_for(end_call_enabled, tools)
         if current_tools:
             params["tools"] = current_tools
-            
-        response = self.client.chat.completions.create(**params)
+            tool_choice = TOOL_DIALECTS[self.tool_dialect]["tool_choice"]
+            if tool_choice is not None:
+                params["tool_choice"] = tool_choice
+        return params
+
+    def _parse_response(self, response) -> tuple[str, Optional[Dict]]:
         message_content = response.choices[0].message.content
         tool_calls = response.choices[0].message.tool_calls or []  # Default to empty list if None
         
@@ -72,6 +246,82 @@ class OpenAIProvider(LLMProvider):
 
         return message_content, end_call_detected
 
+    def _read_usage(self, response, usage: Usage) -> Usage:
+        response_usage = getattr(response, "usage", None)
+        if response_usage is not None:
+            usage.input_tokens = getattr(response_usage, "prompt_tokens", None)
+            usage.output_tokens = getattr(response_usage, "completion_tokens", None)
+            details = getattr(response_usage, "prompt_tokens_details", None)
+            usage.cached_tokens = getattr(details, "cached_tokens", None) if details else None
+        return usage
+
+    def _stream_args(self) -> Dict:
+        args = {"stream": True}
+        if self.stream_usage_option:
+            args["stream_options"] = {"include_usage": True}
+        return args
+
+    def _read_chunk(self, chunk, state: StreamState) -> None:
+        if getattr(chunk, "usage", None) is not None:
+            self._read_usage(chunk, state.usage)
+        elif getattr(getattr(chunk, "x_groq", None), "usage", None) is not None:
+            # Groq reports streaming usage in its own extension field
+            self._read_usage(chunk.x_groq, state.usage)
+        if not chunk.choices:
+            return
+        delta = chunk.choices[0].delta
+        state.add_text(delta.content)
+        for tool_call in delta.tool_calls or []:
+            # The function name arrives once, in the first delta of each tool call
+            if tool_call.function and tool_call.function.name == "end_call":
+                state.add_end_call()
+        
+    def get_completion(
+            self,
+            messages: List[Dict],
+            end_call_enabled: bool = True,
+            tools: Optional[List[Dict]] = None
+    ) -> tuple[str, Optional[Dict]]:
+        return self.get_completion_with_usage(messages, end_call_enabled, tools)[:2]
+
+    async def get_completion_async(
+            self,
+            messages: List[Dict],
+            end_call_enabled: bool = True,
+            tools: Optional[List[Dict]] = None
+    ) -> tuple[str, Optional[Dict]]:
+        return (await self.get_completion_with_usage_async(messages, end_call_enabled, tools))[:2]
+
+    def get_completion_with_usage(
+            self,
+            messages: List[Dict],
+            end_call_enabled: bool = True,
+            tools: Optional[List[Dict]] = None
+    ) -> tuple[str, Optional[Dict], Usage]:
+        params = self._build_params(messages, end_call_enabled, tools)
+        usage = Usage.begin()
+        if self.streaming:
+            stream = self.client.chat.completions.create(**params, **self._stream_args())
+            return self._consume_stream(stream, usage)
+        response = self.client.chat.completions.create(**params)
+        usage.end()
+        return (*self._parse_response(response), self._read_usage(response, usage))
+
+    async def get_completion_with_usage_async(
+            self,
+            messages: List[Dict],
+            end_call_enabled: bool = True,
+            tools: Optional[List[Dict]] = None
+    ) -> tuple[str, Optional[Dict], Usage]:
+        params = self._build_params(messages, end_call_enabled, tools)
+        usage = Usage.begin()
+        if self.streaming:
+            stream = await self.async_client.chat.completions.create(**params, **self._stream_args())
+            return await self._consume_stream_async(stream, usage)
+        response = await self.async_client.chat.completions.create(**params)
+        usage.end()
+        return (*self._parse_response(response), self._read_usage(response, usage))
+
 class AnthropicProvider(LLMProvider):
     #The following models are supported:
     #claude-3-5-sonnet-20241022
@@ -80,17 +330,25 @@ class AnthropicProvider(LLMProvider):
     #claude-3-sonnet-20240229
     #claude-3-haiku-20240307
     def __init__(self, config: LLMConfig):
-        self.client = Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
+        self.client = get_client(Anthropic, os.environ["ANTHROPIC_API_KEY"])
+        self.async_client_spec = (AsyncAnthropic, os.environ["ANTHROPIC_API_KEY"])
         self.config = config
-        
-    def get_completion(self,
-                       messages: List[Dict],
-                       end_call_enabled: bool = True,
-                       tools: Optional[List[Dict]] = None
-    ) -> tuple[str, Optional[Dict]]:
-        # Create a new tools list for this call
-        current_tools = [] if tools is None else tools.copy()
-        
+
+    def _end_call_tool(self) -> Dict:
+        return {
+            "name": "end_call",
+            "description": END_CALL_DESCRIPTION,
+            "input_schema": {
+                "type": "object",
+                "properties": {}
+            }
+        }
+
+    def _build_params(self,
+                      messages: List[Dict],
+                      end_call_enabled: bool = True,
+                      tools: Optional[List[Dict]] = None
+    ) -> Dict:
         # Extract system message and convert remaining messages
         system_message = next((m["content"] for m in messages if m["role"] == "system"), "")
         chat_messages = [m for m in messages if m["role"] != "system"]
@@ -100,22 +358,47 @@ class AnthropicProvider(LLMProvider):
             "system": system_message,  # System prompt goes in top-level parameter
             **self.config.params
         }
-
-        if end_call_enabled:
-            current_tools.append({
-                "name": "end_call",
-                "description": "Ends the conversation by deactivating the active call.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {}
-                }
-            })
-            
+        current_tools = self._tools_for(end_call_enabled, tools)
         if current_tools:
             params["tools"] = current_tools
+        if getattr(self.config, "prompt_caching", False):
+            self._add_cache_breakpoints(params)
+        return params
 
-        response = self.client.messages.create(**params)
-        message_content = response.content[0].text
+    def _cached_tools(self, tools: tuple) -> tuple:
+        """tools with a cache breakpoint on the last definition, built once per tool payload."""
+        marked = self.__dict__.setdefault("_cached_tool_payloads", {})
+        if id(tools) not in marked or marked[id(tools)][0] is not tools:
+            marked[id(tools)] = (tools, (*tools[:-1], {**tools[-1], "cache_control": {"type": "ephemeral"}}))
+        return marked[id(tools)][1]
+
+    def _add_cache_breakpoints(self, params: Dict) -> None:
+        """Mark cache breakpoints on the tools, the system prompt and the conversation prefix.
+        
+        The prefix is cached at the latest user message (written this turn) and the
+        user message before it (written last turn, read now), which uses all four
+        breakpoints Anthropic allows. Prefixes below the model's minimum length are
+        simply not cached."""
+        cache_control = {"type": "ephemeral"}
+        if params.get("tools"):
+            params["tools"] = self._cached_tools(params["tools"])
+        if params["system"]:
+            params["system"] = [{"type": "text", "text": params["system"], "cache_control": cache_control}]
+        
+        # Copy the marked messages; the originals are the conversation's shared history
+        messages = list(params["messages"])
+        user_indices = [i for i, m in enumerate(messages) if m["role"] == "user"][-2:]
+        for i in user_indices:
+            content = messages[i]["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            content = [*content[:-1], {**content[-1], "cache_control": cache_control}]
+            messages[i] = {**messages[i], "content": content}
+        params["messages"] = messages
+
+    def _parse_response(self, response) -> tuple[str, Optional[Dict]]:
+        # The reply may be only a tool_use block, or text around one
+        message_content = "".join(block.text for block in response.content if block.type == "text")
 
         end_call_detected = False
         for block in response.content:
@@ -124,6 +407,73 @@ class AnthropicProvider(LLMProvider):
                 break
         
         return message_content, end_call_detected
+
+    def _read_usage(self, response, usage: Usage) -> Usage:
+        response_usage = getattr(response, "usage", None)
+        if response_usage is not None:
+            usage.output_tokens = getattr(response_usage, "output_tokens", None)
+            usage.cached_tokens = getattr(response_usage, "cache_read_input_tokens", None)
+            usage.cache_write_tokens = getattr(response_usage, "cache_creation_input_tokens", None)
+            # Anthropic reports cache reads and writes separately; fold them in so
+            # input_tokens includes them as it does for the other vendors
+            input_tokens = getattr(response_usage, "input_tokens", None)
+            if input_tokens is not None:
+                usage.input_tokens = input_tokens + (usage.cached_tokens or 0) + (usage.cache_write_tokens or 0)
+        return usage
+
+    def _read_chunk(self, event, state: StreamState) -> None:
+        if event.type == "message_start":
+            self._read_usage(event.message, state.usage)
+        elif event.type == "content_block_start":
+            block = event.content_block
+            if block.type == "tool_use" and block.name == "end_call":
+                state.add_end_call()
+        elif event.type == "content_block_delta":
+            if event.delta.type == "text_delta":
+                state.add_text(event.delta.text)
+        elif event.type == "message_delta":
+            state.usage.output_tokens = event.usage.output_tokens
+        
+    def get_completion(self,
+                       messages: List[Dict],
+                       end_call_enabled: bool = True,
+                       tools: Optional[List[Dict]] = None
+    ) -> tuple[str, Optional[Dict]]:
+        return self.get_completion_with_usage(messages, end_call_enabled, tools)[:2]
+
+    async def get_completion_async(self,
+                                   messages: List[Dict],
+                                   end_call_enabled: bool = True,
+                                   tools: Optional[List[Dict]] = None
+    ) -> tuple[str, Optional[Dict]]:
+        return (await self.get_completion_with_usage_async(messages, end_call_enabled, tools))[:2]
+
+    def get_completion_with_usage(self,
+                                  messages: List[Dict],
+                                  end_call_enabled: bool = True,
+                                  tools: Optional[List[Dict]] = None
+    ) -> tuple[str, Optional[Dict], Usage]:
+        params = self._build_params(messages, end_call_enabled, tools)
+        usage = Usage.begin()
+        if self.streaming:
+            return self._consume_stream(self.client.messages.create(**params, stream=True), usage)
+        response = self.client.messages.create(**params)
+        usage.end()
+        return (*self._parse_response(response), self._read_usage(response, usage))
+
+    async def get_completion_with_usage_async(self,
+                                              messages: List[Dict],
+                                              end_call_enabled: bool = True,
+                                              tools: Optional[List[Dict]] = None
+    ) -> tuple[str, Optional[Dict], Usage]:
+        params = self._build_params(messages, end_call_enabled, tools)
+        usage = Usage.begin()
+        if self.streaming:
+            stream = await self.async_client.messages.create(**params, stream=True)
+            return await self._consume_stream_async(stream, usage)
+        response = await self.async_client.messages.create(**params)
+        usage.end()
+        return (*self._parse_response(response), self._read_usage(response, usage))
     
 class TogetherAIProvider(OpenAIProvider):
     #The following models are supported:
@@ -137,10 +487,8 @@ class TogetherAIProvider(OpenAIProvider):
     #Qwen/Qwen2.5-72B-Instruct-Turbo
     def __init__(self, config: LLMConfig):
         self.config = config
-        self.client = OpenAI(
-            base_url="https://api.together.xyz/v1",
-            api_key=os.environ["TOGETHER_API_KEY"]
-        )
+        self.client = get_client(OpenAI, os.environ["TOGETHER_API_KEY"], "https://api.together.xyz/v1")
+        self.async_client_spec = (AsyncOpenAI, os.environ["TOGETHER_API_KEY"], "https://api.together.xyz/v1")
     
 class GroqProvider(OpenAIProvider):
     #The following models are supported:
@@ -151,9 +499,12 @@ class GroqProvider(OpenAIProvider):
     #llama-3.1-8b-instant
     #mixtral-8x7b-32768
     #gemma2-9b-it
+    stream_usage_option = False  # usage arrives in the x_groq field of the final chunk
+
     def __init__(self, config: LLMConfig):
         self.config = config
-        self.client = Groq(api_key=os.environ["GROQ_API_KEY"])
+        self.client = get_client(Groq, os.environ["GROQ_API_KEY"])
+        self.async_client_spec = (AsyncGroq, os.environ["GROQ_API_KEY"])
 
 class DeepSeekProvider(OpenAIProvider):
     #The following models are supported:
@@ -161,10 +512,8 @@ class DeepSeekProvider(OpenAIProvider):
     #deepseek-reasoner
     def __init__(self, config: LLMConfig):
         self.config = config
-        self.client = OpenAI(
-            api_key=os.environ["DEEPSEEK_API_KEY"],
-            base_url="https://api.deepseek.com"
-        )
+        self.client = get_client(OpenAI, os.environ["DEEPSEEK_API_KEY"], "https://api.deepseek.com")
+        self.async_client_spec = (AsyncOpenAI, os.environ["DEEPSEEK_API_KEY"], "https://api.deepseek.com")
 
 class CerebrasProvider(OpenAIProvider):
     #The following models are supported:
@@ -173,63 +522,26 @@ class CerebrasProvider(OpenAIProvider):
     #DeepSeek-R1-Distill-Llama-70B
     def __init__(self, config: LLMConfig):
         self.config = config
-        self.client = Cerebras(
-            api_key=os.environ.get("CEREBRAS_API_KEY"),
-        )
+        self.client = get_client(Cerebras, os.environ.get("CEREBRAS_API_KEY"))
+        self.async_client_spec = (AsyncCerebras, os.environ.get("CEREBRAS_API_KEY"))
 
 class XAIProvider(OpenAIProvider):
     #The following models are supported:
     #grok-2-1212
+    tool_dialect = "xai"
+
     def __init__(self, config: LLMConfig):
         self.config = config
-        self.client = OpenAI(
-            api_key=os.environ["XAI_API_KEY"],
-            base_url="https://api.x.ai/v1"
-        )
-        
-    def get_completion(
-            self,
-            messages: List[Dict],
-            end_call_enabled: bool = True,
-            tools: Optional[List[Dict]] = None
-    ) -> tuple[str, Optional[Dict]]:
-        current_tools = [] if tools is None else tools.copy()
-        
-        params = {
-            "messages": messages,
-            **self.config.params
-        }
-        
-        if end_call_enabled:
-            current_tools.append({
-                "type": "function",
-                "function": {
-                    "name": "end_call",
-                    "description": "Ends the conversation by deactivating the active call.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {},
-                        "additionalProperties": False
-                    },
-                    "strict": False
-                }
-            })
-            
-        if current_tools:
-            params["tools"] = current_tools
-            params["tool_choice"] = "auto"
-            
-        response = self.client.chat.completions.create(**params)
-        message_content = response.choices[0].message.content
-        tool_calls = response.choices[0].message.tool_calls or []
-        
-        end_call_detected = False
-        for tool_call in tool_calls:
-            if tool_call.function.name == "end_call":
-                end_call_detected = True
-                break
+        self.client = get_client(OpenAI, os.environ["XAI_API_KEY"], "https://api.x.ai/v1")
+        self.async_client_spec = (AsyncOpenAI, os.environ["XAI_API_KEY"], "https://api.x.ai/v1")
 
-        return message_content, end_call_detected
+@dataclass
+class _GeminiSession:
+    """Gemini-format history of one conversation's message list, converted incrementally."""
+    messages: List[Dict]
+    synced: int = 0
+    system_instruction: Optional[str] = None
+    history: List[types.Content] = field(default_factory=list)
 
 class GeminiProvider(LLMProvider):
     #The following model is supported:
@@ -238,9 +550,18 @@ class GeminiProvider(LLMProvider):
     #gemini-1.5-flash
     #gemini-1.5-flash-8b
     #gemini-1.5-pro
+    # Conversations whose converted history is kept; the least recently used are dropped.
+    # Conversations release theirs through end_conversation, so this only bounds direct callers.
+    max_sessions = 1024
+    # Gemini contents must start with a user turn; sent ahead of a conversation this speaker opened
+    opening_user_turn = "(The conversation begins.)"
+
     def __init__(self, config: LLMConfig):
         self.config = config
-        self.client = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+        self._sessions: OrderedDict[int, _GeminiSession] = OrderedDict()
+        self._sessions_lock = threading.Lock()
+        self.client = get_client(genai.Client, os.environ["GEMINI_API_KEY"])
+        self.async_client_spec = (genai.Client, os.environ["GEMINI_API_KEY"])
         
         # Convert the end_call method to an OpenAPI-style function declaration
         self.end_call_fn_decl = types.FunctionDeclaration.from_callable(
@@ -253,47 +574,55 @@ class GeminiProvider(LLMProvider):
         """This function can be called by the LLM to end the conversation."""
         return True
 
-    def get_completion(
+    def _session_for(self, messages: List[Dict]) -> _GeminiSession:
+        """Session whose converted history is brought up to date with messages.
+        Conversations append to the same message list every turn, so only new messages are converted."""
+        key = id(messages)
+        with self._sessions_lock:
+            session = self._sessions.get(key)
+            if session is None or session.messages is not messages or len(messages) < session.synced:
+                session = self._sessions[key] = _GeminiSession(messages)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(key)
+            for msg in messages[session.synced:]:
+                if msg["role"] == "system":
+                    session.system_instruction = msg["content"]
+                    continue
+                # Map assistant messages to the model role, all others as user
+                role = "model" if msg["role"] == "assistant" else "user"
+                if not session.history and role == "model":
+                    session.history.append(types.Content(parts=[types.Part(text=self.opening_user_turn)], role="user"))
+                session.history.append(types.Content(parts=[types.Part(text=msg["content"])], role=role))
+            session.synced = len(messages)
+            return session
+
+    def end_conversation(self, messages: List[Dict]) -> None:
+        with self._sessions_lock:
+            session = self._sessions.get(id(messages))
+            if session is not None and session.messages is messages:
+                del self._sessions[id(messages)]
+
+    def _end_call_tool(self) -> types.Tool:
+        return self.end_call_tool
+
+    def _build_request(
         self,
         messages: List[Dict],
         end_call_enabled: bool = True,
         tools: Optional[List[types.Tool]] = None
-    ) -> tuple[str, Optional[Dict]]:
-        # Start with any additional tools provided
-        current_tools = [] if tools is None else tools.copy()
-        
-        # Add the end_call tool if enabled
-        if end_call_enabled:
-            current_tools.append(self.end_call_tool)
-        
-        # Convert OpenAI-style messages to Gemini format
-        history = []
-        for msg in messages:
-            # Map assistant messages to the model role, all others as user
-            role = "model" if msg["role"] == "assistant" else "user"
-            history.append(
-                types.Content(
-                    parts=[types.Part(text=msg["content"])],
-                    role=role
-                )
-            )
-        
-        # Build a configuration dictionary that includes our tools.
-        config = {'tools': current_tools}
-        
-        # Create a chat session with the chat history (all except the last message)
-        chat = self.client.chats.create(
-            history=history[:-1] if history else [],
-            config=config,
-            **self.config.params
-        )
-        
-        # Send the latest message and get the response
-        if history:
-            response = chat.send_message(history[-1].parts[0].text)
-        else:
-            return "", False
-        
+    ) -> Dict:
+        current_tools = list(self._tools_for(end_call_enabled, tools))
+        session = self._session_for(messages)
+        # Everything but the model name is generation config (temperature, max_output_tokens, ...)
+        params = dict(self.config.params)
+        model = params.pop("model")
+        config = {**params, "tools": current_tools}
+        if session.system_instruction:
+            config["system_instruction"] = session.system_instruction
+        return {"model": model, "contents": session.history, "config": config}
+
+    def _parse_response(self, response) -> tuple[str, Optional[Dict]]:
         # Check if any function calls were returned from the model
         function_calls = response.function_calls or []
         #print("Function calls returned:", function_calls)
@@ -303,4 +632,74 @@ class GeminiProvider(LLMProvider):
         if end_call_detected:
             #print("End call detected")
             return "", True
-        return response.text, False
\ No newline at end of file
+        return response.text, False
+
+    def _read_usage(self, response, usage: Usage) -> Usage:
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is not None:
+            usage.input_tokens = metadata.prompt_token_count
+            usage.output_tokens = metadata.candidates_token_count
+            usage.cached_tokens = metadata.cached_content_token_count
+        return usage
+
+    def _read_chunk(self, chunk, state: StreamState) -> None:
+        if any(fn.name == "end_call" for fn in chunk.function_calls or []):
+            state.add_end_call()
+        candidates = chunk.candidates or []
+        if candidates and candidates[0].content:
+            for part in candidates[0].content.parts or []:
+                state.add_text(part.text)
+        if chunk.usage_metadata is not None:
+            self._read_usage(chunk, state.usage)
+
+    def get_completion(
+        self,
+        messages: List[Dict],
+        end_call_enabled: bool = True,
+        tools: Optional[List[types.Tool]] = None
+    ) -> tuple[str, Optional[Dict]]:
+        return self.get_completion_with_usage(messages, end_call_enabled, tools)[:2]
+
+    async def get_completion_async(
+        self,
+        messages: List[Dict],
+        end_call_enabled: bool = True,
+        tools: Optional[List[types.Tool]] = None
+    ) -> tuple[str, Optional[Dict]]:
+        return (await self.get_completion_with_usage_async(messages, end_call_enabled, tools))[:2]
+
+    def get_completion_with_usage(
+        self,
+        messages: List[Dict],
+        end_call_enabled: bool = True,
+        tools: Optional[List[types.Tool]] = None
+    ) -> tuple[str, Optional[Dict], Usage]:
+        request = self._build_request(messages, end_call_enabled, tools)
+        usage = Usage.begin()
+        if not request["contents"]:
+            return "", False, usage.end()
+        
+        if self.streaming:
+            return self._consume_stream(self.client.models.generate_content_stream(**request), usage)
+        response = self.client.models.generate_content(**request)
+        usage.end()
+        return (*self._parse_response(response), self._read_usage(response, usage))
+
+    async def get_completion_with_usage_async(
+        self,
+        messages: List[Dict],
+        end_call_enabled: bool = True,
+        tools: Optional[List[types.Tool]] = None
+    ) -> tuple[str, Optional[Dict], Usage]:
+        request = self._build_request(messages, end_call_enabled, tools)
+        usage = Usage.begin()
+        if not request["contents"]:
+            return "", False, usage.end()
+        
+        models = self.async_client.aio.models
+        if self.streaming:
+            stream = await models.generate_content_stream(**request)
+            return await self._consume_stream_async(stream, usage)
+        response = await models.generate_content(**request)
+        usage.end()
+        return (*self._parse_response(response), self._read_usage(response, usage))
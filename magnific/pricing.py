@@ -0,0 +1,214 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """List price of a model in USD per million tokens.
+    cached_input applies to prompt tokens served from the vendor's prompt cache and
+    cache_write to tokens written to it; None means the normal input price."""
+    input: float
+    output: float
+    cached_input: Optional[float] = None
+    cache_write: Optional[float] = None
+
+# List prices at the time of writing. Pass pricing= to TestRunner to override or extend.
+PRICING: Dict[str, ModelPrice] = {
+    # OpenAI
+    "gpt-4o": ModelPrice(2.50, 10.00, 1.25),
+    "gpt-4o-mini": ModelPrice(0.15, 0.60, 0.075),
+    "gpt-3.5-turbo-0125": ModelPrice(0.50, 1.50),
+    "o1": ModelPrice(15.00, 60.00, 7.50),
+    "o1-mini": ModelPrice(1.10, 4.40, 0.55),
+    "o3-mini": ModelPrice(1.10, 4.40, 0.55),
+    # Anthropic
+    "claude-3-5-sonnet-20241022": ModelPrice(3.00, 15.00, 0.30, 3.75),
+    "claude-3-5-haiku-20241022": ModelPrice(0.80, 4.00, 0.08, 1.00),
+    "claude-3-opus-20240229": ModelPrice(15.00, 75.00, 1.50, 18.75),
+    "claude-3-sonnet-20240229": ModelPrice(3.00, 15.00, 0.30, 3.75),
+    "claude-3-haiku-20240307": ModelPrice(0.25, 1.25, 0.03, 0.30),
+    # Gemini
+    "gemini-2.0-flash": ModelPrice(0.10, 0.40, 0.025),
+    "gemini-2.0-flash-lite-preview-02-05": ModelPrice(0.075, 0.30),
+    "gemini-1.5-flash": ModelPrice(0.075, 0.30, 0.01875),
+    "gemini-1.5-flash-8b": ModelPrice(0.0375, 0.15, 0.01),
+    "gemini-1.5-pro": ModelPrice(1.25, 5.00, 0.3125),
+    # DeepSeek
+    "deepseek-chat": ModelPrice(0.27, 1.10, 0.07),
+    "deepseek-reasoner": ModelPrice(0.55, 2.19, 0.14),
+    # Groq
+    "qwen-2.5-32b": ModelPrice(0.79, 0.79),
+    "deepseek-r1-distill-qwen-32b": ModelPrice(0.69, 0.69),
+    "deepseek-r1-distill-llama-70b": ModelPrice(0.75, 0.99),
+    "llama-3.3-70b-versatile": ModelPrice(0.59, 0.79),
+    "llama-3.1-8b-instant": ModelPrice(0.05, 0.08),
+    "mixtral-8x7b-32768": ModelPrice(0.24, 0.24),
+    "gemma2-9b-it": ModelPrice(0.20, 0.20),
+    # Together AI
+    "meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo": ModelPrice(0.18, 0.18),
+    "meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo": ModelPrice(0.88, 0.88),
+    "meta-llama/Meta-Llama-3.1-405B-Instruct-Turbo": ModelPrice(3.50, 3.50),
+    "meta-llama/Llama-3.3-70B-Instruct-Turbo": ModelPrice(0.88, 0.88),
+    "mistralai/Mixtral-8x7B-Instruct-v0.1": ModelPrice(0.60, 0.60),
+    "mistralai/Mistral-7B-Instruct-v0.1": ModelPrice(0.20, 0.20),
+    "Qwen/Qwen2.5-7B-Instruct-Turbo": ModelPrice(0.30, 0.30),
+    "Qwen/Qwen2.5-72B-Instruct-Turbo": ModelPrice(1.20, 1.20),
+    # Cerebras
+    "llama3.1-8b": ModelPrice(0.10, 0.10),
+    "llama-3.3-70b": ModelPrice(0.85, 1.20),
+    "DeepSeek-R1-Distill-Llama-70B": ModelPrice(2.20, 2.50),
+    # xAI
+    "grok-2-1212": ModelPrice(2.00, 10.00),
+}
+
+def get_price(model: Optional[str], pricing: Optional[Dict[str, ModelPrice]] = None) -> Optional[ModelPrice]:
+    if model is None:
+        return None
+    if pricing and model in pricing:
+        return pricing[model]
+    return PRICING.get(model)
+
+def token_cost(
+    price: Optional[ModelPrice],
+    input_tokens: int,
+    output_tokens: int,
+    cached_tokens: int = 0,
+    cache_write_tokens: int = 0
+) -> Optional[float]:
+    """USD cost of a request. input_tokens includes cached_tokens and cache_write_tokens,
+    as every provider reports it. Returns None when the model has no known price."""
+    if price is None:
+        return None
+    cached_rate = price.input if price.cached_input is None else price.cached_input
+    write_rate = price.input if price.cache_write is None else price.cache_write
+    return (
+        (input_tokens - cached_tokens - cache_write_tokens) * price.input
+        + cached_tokens * cached_rate
+        + cache_write_tokens * write_rate
+        + output_tokens * price.output
+    ) / 1_000_000
+
+TOKEN_FIELDS = ("input_tokens", "output_tokens", "cached_tokens", "cache_write_tokens")
+
+def _empty_line() -> Dict[str, Any]:
+    return {**{name: 0 for name in TOKEN_FIELDS}, "cost": 0.0}
+
+def _add_line(line: Dict[str, Any], tokens: Dict[str, Any], cost: Optional[float]) -> None:
+    for name in TOKEN_FIELDS:
+        line[name] += tokens.get(name) or 0
+    if cost is None or line["cost"] is None:
+        # One unpriced request makes the total unknown rather than silently low
+        line["cost"] = None
+    else:
+        line["cost"] += cost
+
+def _request_cost(price: Optional[ModelPrice], tokens: Dict[str, Any]) -> Optional[float]:
+    counts = {name: tokens.get(name) or 0 for name in TOKEN_FIELDS}
+    if not counts["input_tokens"] and not counts["output_tokens"]:
+        return 0.0  # no reported usage, e.g. a local cache hit
+    return token_cost(price, **counts)
+
+def cost_breakdown(
+    turns: Iterable[Dict[str, Any]],
+    service_model: Optional[str],
+    customer_model: Optional[str],
+    judge_usage: Optional[Dict[str, int]] = None,
+    judge_model: Optional[str] = None,
+    pricing: Optional[Dict[str, ModelPrice]] = None
+) -> Dict[str, Any]:
+    """Tokens and USD cost of one test, split into service agent, customer agent and judge."""
+    models = {"service_agent": service_model, "customer_agent": customer_model}
+    breakdown = {"service_agent": _empty_line(), "customer_agent": _empty_line(), "judge": _empty_line()}
+    for turn in turns:
+        if turn.get("latency") is None:
+            continue  # scripted first message
+        _add_line(breakdown[turn["speaker"]], turn, _request_cost(get_price(models[turn["speaker"]], pricing), turn))
+    if judge_usage:
+        _add_line(breakdown["judge"], judge_usage, _request_cost(get_price(judge_model, pricing), judge_usage))
+    costs = [line["cost"] for line in breakdown.values()]
+    return {
+        **breakdown,
+        "total_tokens": sum(line["input_tokens"] + line["output_tokens"] for line in breakdown.values()),
+        "total_cost": None if None in costs else sum(costs)
+    }
+
+class BudgetExhausted(Exception):
+    """Raised instead of sending a request once a run's max_cost or max_tokens has been spent."""
+
+class Budget:
+    """Spend of one run. Each request reserves its estimated cost before it is sent and is
+    charged its reported usage afterwards, so requests in flight count against the cap and
+    concurrent conversations can't all start a request on the last few cents."""
+    def __init__(
+        self,
+        max_cost: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        pricing: Optional[Dict[str, ModelPrice]] = None
+    ):
+        self.max_cost = max_cost
+        self.max_tokens = max_tokens
+        self.pricing = pricing
+        self.cost = 0.0  # lower bound when some model is unpriced
+        self.tokens = 0
+        self.reserved_cost = 0.0
+        self.reserved_tokens = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return (
+            (self.max_cost is not None and self.cost + self.reserved_cost >= self.max_cost)
+            or (self.max_tokens is not None and self.tokens + self.reserved_tokens >= self.max_tokens)
+        )
+
+    def reserve(self, model: Optional[str], input_tokens: int, output_tokens: int) -> Tuple[float, int]:
+        """Hold the estimated cost of a request about to be sent; raises BudgetExhausted if the
+        budget is already spent or held. Pass the result to release once the request is done."""
+        if self.exhausted:
+            raise BudgetExhausted(f"Budget reached: spent ${self.cost:.4f} and {self.tokens} tokens")
+        reservation = (token_cost(get_price(model, self.pricing), input_tokens, output_tokens) or 0.0, input_tokens + output_tokens)
+        self.reserved_cost += reservation[0]
+        self.reserved_tokens += reservation[1]
+        return reservation
+
+    def release(self, reservation: Optional[Tuple[float, int]]) -> None:
+        if reservation is not None:
+            self.reserved_cost -= reservation[0]
+            self.reserved_tokens -= reservation[1]
+
+    def charge(self, model: Optional[str], tokens: Dict[str, Any]) -> None:
+        """Add one request's reported token usage to the spend."""
+        self.tokens += (tokens.get("input_tokens") or 0) + (tokens.get("output_tokens") or 0)
+        self.cost += _request_cost(get_price(model, self.pricing), tokens) or 0.0
+
+class CostTracker:
+    """Running totals of cost_breakdown results across a run."""
+    def __init__(self):
+        self.breakdown = {"service_agent": _empty_line(), "customer_agent": _empty_line(), "judge": _empty_line()}
+        self.total_tokens = 0
+        self.total_cost = 0.0
+        self.unpriced = False
+
+    def add(self, cost: Optional[Dict[str, Any]]) -> None:
+        if not cost:
+            return
+        for role, line in self.breakdown.items():
+            _add_line(line, cost[role], cost[role]["cost"])
+        self.total_tokens += cost["total_tokens"]
+        if cost["total_cost"] is None:
+            self.unpriced = True
+        # Keep a lower bound on spend even when some model is unpriced, so budgets still apply
+        self.total_cost += sum(cost[role]["cost"] or 0.0 for role in self.breakdown)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            **self.breakdown,
+            "total_tokens": self.total_tokens,
+            "total_cost": None if self.unpriced else self.total_cost,
+            "known_cost": self.total_cost
+        }
+
+def format_cost(summary: Dict[str, Any]) -> str:
+    def usd(value: Optional[float]) -> str:
+        return f"${value:.4f}" if value is not None else "unknown"
+    parts = [f"{role} {usd(summary[role]['cost'])}" for role in ("service_agent", "customer_agent", "judge")]
+    total = usd(summary["total_cost"]) if summary["total_cost"] is not None else f"at least {usd(summary['known_cost'])}"
+    return f"Cost: {total} ({', '.join(parts)}), {summary['total_tokens']} tokens"
@@ -0,0 +1,118 @@
+"""Resolve provider names and model names to LLMProvider classes, and share instances.
+
+Saved results record each agent's provider, but older ones (and configs typed
+into the web UI) only name a model. resolve_provider_class accepts either.
+get_provider returns one instance per (provider class, config), so rebuilding
+hundreds of rows of a rerun reuses the same providers and their warm clients.
+"""
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Dict, Optional, Tuple, Type
+from magnific.llm_config import LLMConfig
+from magnific.llm_providers import (
+    LLMProvider,
+    OpenAIProvider,
+    AnthropicProvider,
+    TogetherAIProvider,
+    GroqProvider,
+    DeepSeekProvider,
+    CerebrasProvider,
+    XAIProvider,
+    GeminiProvider,
+)
+
+PROVIDERS: Dict[str, Type[LLMProvider]] = {
+    "openai": OpenAIProvider,
+    "anthropic": AnthropicProvider,
+    "together": TogetherAIProvider,
+    "groq": GroqProvider,
+    "deepseek": DeepSeekProvider,
+    "cerebras": CerebrasProvider,
+    "xai": XAIProvider,
+    "gemini": GeminiProvider,
+}
+
+# Models served by more than one vendor map to the one listed in its provider class
+MODEL_PROVIDERS: Dict[str, str] = {
+    "gpt-3.5-turbo-0125": "openai",
+    "deepseek-chat": "deepseek",
+    "deepseek-reasoner": "deepseek",
+    "qwen-2.5-32b": "groq",
+    "deepseek-r1-distill-qwen-32b": "groq",
+    "deepseek-r1-distill-llama-70b": "groq",
+    "llama-3.3-70b-versatile": "groq",
+    "llama-3.1-8b-instant": "groq",
+    "mixtral-8x7b-32768": "groq",
+    "gemma2-9b-it": "groq",
+    "llama3.1-8b": "cerebras",
+    "llama-3.3-70b": "cerebras",
+    "DeepSeek-R1-Distill-Llama-70B": "cerebras",
+}
+
+# Checked in order after MODEL_PROVIDERS
+MODEL_PREFIXES: Tuple[Tuple[str, str], ...] = (
+    ("gpt-", "openai"),
+    ("ft:gpt-", "openai"),  # fine-tuned OpenAI models
+    ("o1", "openai"),
+    ("o3", "openai"),
+    ("claude-", "anthropic"),
+    ("gemini-", "gemini"),
+    ("grok-", "xai"),
+)
+
+def resolve_provider_class(model: Optional[str] = None, provider: Optional[str] = None) -> Type[LLMProvider]:
+    """Provider class for an explicit provider ("anthropic" or "AnthropicProvider"), else for the model name.
+    Raises ValueError when neither identifies a provider."""
+    if provider:
+        if provider.lower() in PROVIDERS:
+            return PROVIDERS[provider.lower()]
+        for provider_class in PROVIDERS.values():
+            if provider_class.__name__ == provider:
+                return provider_class
+        raise ValueError(f"Unknown provider {provider!r}; expected one of {sorted(PROVIDERS)}")
+    if not model:
+        raise ValueError("A model or provider is required to choose a provider")
+    if model in MODEL_PROVIDERS:
+        return PROVIDERS[MODEL_PROVIDERS[model]]
+    for prefix, name in MODEL_PREFIXES:
+        if model.startswith(prefix):
+            return PROVIDERS[name]
+    if "/" in model:
+        # Together model IDs are namespaced by organisation, e.g. meta-llama/Llama-3.3-70B-Instruct-Turbo
+        return TogetherAIProvider
+    raise ValueError(f"Can't tell which provider serves model {model!r}; set provider explicitly")
+
+# Instances kept for reuse; the least recently used are dropped
+MAX_PROVIDERS = 256
+
+_lock = threading.Lock()
+_providers: "OrderedDict[Tuple[type, str], LLMProvider]" = OrderedDict()
+
+def _config_key(config: LLMConfig) -> str:
+    return json.dumps(asdict(config), sort_keys=True, default=repr)
+
+def get_provider(provider_class: Type[LLMProvider], config: LLMConfig) -> LLMProvider:
+    """Shared instance of a built-in provider for this config. Other classes are built fresh,
+    since a custom provider may keep per-conversation state."""
+    if provider_class not in PROVIDERS.values():
+        return provider_class(config=config)
+    key = (provider_class, _config_key(config))
+    with _lock:
+        provider = _providers.get(key)
+        if provider is not None:
+            _providers.move_to_end(key)
+            return provider
+        provider = _providers[key] = provider_class(config=config)
+        if len(_providers) > MAX_PROVIDERS:
+            _providers.popitem(last=False)
+        return provider
+
+def provider_for(config: LLMConfig, provider: Optional[str] = None) -> LLMProvider:
+    """Shared provider for config, chosen from provider or else config.params["model"]."""
+    return get_provider(resolve_provider_class(config.params.get("model"), provider), config)
+
+def clear_providers() -> None:
+    with _lock:
+        _providers.clear()
@@ -0,0 +1,122 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, List, Optional
+from magnific.llm_config import RetryPolicy
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, overload and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+@dataclass
+class AttemptRecord:
+    """Timing and outcome of a single provider request attempt."""
+    attempt: int
+    started_at: float
+    duration: float
+    error: Optional[str] = None
+    retryable: Optional[bool] = None
+    sleep: float = 0.0
+
+    def to_dict(self):
+        return asdict(self)
+
+def get_status_code(exc: BaseException) -> Optional[int]:
+    # OpenAI-compatible SDKs expose status_code, google-genai exposes code
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(exc, "code", None)
+    return status if isinstance(status, int) else None
+
+def is_retryable(exc: BaseException) -> bool:
+    """Classify an exception as transient (retry) or fatal (give up)."""
+    status = get_status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    if isinstance(exc, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    # Transport-level errors from the vendor SDKs (APIConnectionError, APITimeoutError, httpx errors)
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name
+
+def get_retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait, from Retry-After / retry-after-ms headers."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(policy: RetryPolicy, attempt: int, exc: BaseException) -> float:
+    """Delay before the next attempt: Retry-After if given, else exponential backoff with full jitter."""
+    retry_after = get_retry_after(exc)
+    if retry_after is not None:
+        return min(retry_after, policy.max_retry_after)
+    ceiling = min(policy.max_delay, policy.base_delay * (2 ** (attempt - 1)))
+    return random.uniform(0, ceiling) if policy.jitter else ceiling
+
+def call_with_retry(
+    fn: Callable[[], Any],
+    policy: RetryPolicy,
+    attempts: Optional[List[AttemptRecord]] = None
+) -> Any:
+    """Call fn, retrying transient failures according to policy.
+    Each attempt is appended to attempts if a list is given."""
+    attempts = attempts if attempts is not None else []
+    for attempt in range(1, policy.max_attempts + 1):
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            result = fn()
+            attempts.append(AttemptRecord(attempt, started_at, time.perf_counter() - start))
+            return result
+        except Exception as e:
+            retryable = is_retryable(e)
+            record = AttemptRecord(attempt, started_at, time.perf_counter() - start, repr(e), retryable)
+            attempts.append(record)
+            if not retryable or attempt == policy.max_attempts:
+                raise
+            record.sleep = backoff_delay(policy, attempt, e)
+            time.sleep(record.sleep)
+
+async def call_with_retry_async(
+    fn: Callable[[], Awaitable[Any]],
+    policy: RetryPolicy,
+    attempts: Optional[List[AttemptRecord]] = None
+) -> Any:
+    """Async variant of call_with_retry; fn must return a fresh awaitable on each call."""
+    attempts = attempts if attempts is not None else []
+    for attempt in range(1, policy.max_attempts + 1):
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            result = await fn()
+            attempts.append(AttemptRecord(attempt, started_at, time.perf_counter() - start))
+            return result
+        except Exception as e:
+            retryable = is_retryable(e)
+            record = AttemptRecord(attempt, started_at, time.perf_counter() - start, repr(e), retryable)
+            attempts.append(record)
+            if not retryable or attempt == policy.max_attempts:
+                raise
+            record.sleep = backoff_delay(policy, attempt, e)
+            await asyncio.sleep(record.sleep)
@@ -0,0 +1,228 @@
+"""
+Sharded runs split one suite across processes or machines.
+
+The work directory holds a manifest, one pickled shard of conversation specs per
+worker, and each shard's run_results_shard_<n>.jsonl. Any process that can see
+the directory can run shards: each shard is claimed with an exclusive lock file,
+and a rerun of a shard resumes from its own log. Test IDs are assigned once when
+the shards are written, so the merged report is the same however the work was split.
+"""
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+from magnific.cache import SQLiteCache
+from magnific.conversation import LLMConversation
+from magnific.evaluators.evaluator import ResultSink, get_default_logs_dir, load_run_results
+from magnific.test_runner import TestRunner
+from magnific.usage import UsageStats
+from magnific.pricing import CostTracker
+
+MANIFEST_NAME = "shards.json"
+
+def _shard_path(work_dir: Path, index: int) -> Path:
+    return work_dir / f"shard_{index}.pkl"
+
+def _shard_log(work_dir: Path, index: int) -> Path:
+    return work_dir / f"run_results_shard_{index}.jsonl"
+
+def prepare_shards(
+    conversations: List[LLMConversation],
+    work_dir: Union[str, Path],
+    num_shards: int,
+    runner: TestRunner,
+    max_turns: int = 20,
+    first_test_id: int = 1
+) -> Path:
+    """Write conversations into num_shards contiguous shards plus a manifest with the runner settings."""
+    if runner.judge_batch_backend is not None:
+        raise ValueError("Deferred batch judging is not supported in sharded runs")
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    
+    shard_size = math.ceil(len(conversations) / num_shards) if conversations else 0
+    for index in range(num_shards):
+        start = index * shard_size
+        chunk = conversations[start:start + shard_size]
+        shard = [(first_test_id + start + offset, conv.to_spec()) for offset, conv in enumerate(chunk)]
+        with _shard_path(work_dir, index).open("wb") as f:
+            pickle.dump(shard, f)
+    
+    judge_cache = runner.judge_cache
+    options = {
+        "eval_model": runner.eval_model,
+        "max_concurrency": runner.max_concurrency,
+        "rate_limits": runner.rate_limits,
+        "batch_judging": runner.batch_judging,
+        "judge_cache": {
+            "path": str(judge_cache.path),
+            "namespace": judge_cache.namespace,
+            "max_bytes": judge_cache.max_bytes,
+            "touch_batch": judge_cache.touch_batch
+        } if judge_cache is not None else None,
+        "max_turns": max_turns,
+        "pricing": runner.pricing,
+        # Each shard gets an equal share of the run's budget
+        "max_cost": runner.max_cost / num_shards if runner.max_cost is not None else None,
+        "max_tokens": max(1, runner.max_tokens // num_shards) if runner.max_tokens is not None else None,
+    }
+    with (work_dir / "options.pkl").open("wb") as f:
+        pickle.dump(options, f)
+    
+    manifest = {
+        "created": datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
+        "num_shards": num_shards,
+        "num_tests": len(conversations),
+        "evaluation_names": [evaluation.name for conv in conversations for evaluation in conv.evaluations]
+    }
+    manifest_path = work_dir / MANIFEST_NAME
+    with manifest_path.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
+
+def _claim(work_dir: Path, index: int) -> bool:
+    try:
+        fd = os.open(work_dir / f"shard_{index}.lock", os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as f:
+        f.write(f"{os.uname().nodename}:{os.getpid()}\n")
+    return True
+
+def _release(work_dir: Path, index: int) -> None:
+    try:
+        os.remove(work_dir / f"shard_{index}.lock")
+    except FileNotFoundError:
+        pass
+
+def run_shard(work_dir: Union[str, Path], index: int, rate_limit_share: float = 1.0) -> Path:
+    """Run one shard in this process on a fresh event loop, resuming from its log if present."""
+    work_dir = Path(work_dir)
+    with (work_dir / "options.pkl").open("rb") as f:
+        options = pickle.load(f)
+    with _shard_path(work_dir, index).open("rb") as f:
+        shard = pickle.load(f)
+    
+    judge_cache = SQLiteCache(**options["judge_cache"]) if options["judge_cache"] else None
+    runner = TestRunner(
+        eval_model=options["eval_model"],
+        max_concurrency=options["max_concurrency"],
+        rate_limits=options["rate_limits"],
+        judge_cache=judge_cache,
+        batch_judging=options["batch_judging"],
+        pricing=options.get("pricing"),
+        max_cost=options.get("max_cost"),
+        max_tokens=options.get("max_tokens")
+    )
+    runner.rate_limit_share = rate_limit_share
+    
+    log_path = _shard_log(work_dir, index)
+    asyncio.run(runner.run_tests(
+        [LLMConversation.from_spec(spec) for _, spec in shard],
+        max_turns=options["max_turns"],
+        logs_dir=work_dir,
+        keep_results=False,
+        resume_from=log_path if log_path.exists() else None,
+        run_name=f"shard_{index}",
+        test_ids=[test_id for test_id, _ in shard]
+    ))
+    (work_dir / f"shard_{index}.done").touch()
+    return log_path
+
+def run_available_shards(work_dir: Union[str, Path], rate_limit_share: float = 1.0) -> List[int]:
+    """Claim and run every shard that is neither done nor being run elsewhere.
+    Start this on each machine that shares work_dir. Returns the shards it ran.
+    A worker that dies leaves its shard_<n>.lock behind; delete it to let the shard be retried."""
+    work_dir = Path(work_dir)
+    with (work_dir / MANIFEST_NAME).open(encoding="utf-8") as f:
+        manifest = json.load(f)
+    
+    ran = []
+    for index in range(manifest["num_shards"]):
+        if (work_dir / f"shard_{index}.done").exists() or not _claim(work_dir, index):
+            continue
+        try:
+            run_shard(work_dir, index, rate_limit_share)
+            ran.append(index)
+        finally:
+            _release(work_dir, index)
+    return ran
+
+def merge_shards(
+    work_dir: Union[str, Path],
+    logs_dir: Optional[Union[str, Path]] = None,
+    keep_results: bool = True
+) -> Dict[Any, Dict]:
+    """Merge every shard's results log into one run report in logs_dir, ordered by test ID."""
+    work_dir = Path(work_dir)
+    with (work_dir / MANIFEST_NAME).open(encoding="utf-8") as f:
+        manifest = json.load(f)
+    
+    missing = [
+        index for index in range(manifest["num_shards"])
+        if not (work_dir / f"shard_{index}.done").exists()
+    ]
+    if missing:
+        print(f"Warning: shards {missing} have not finished; merging partial results")
+    
+    sink = ResultSink(logs_dir=logs_dir or get_default_logs_dir(), evaluation_names=manifest["evaluation_names"])
+    results = {}
+    usage_stats = UsageStats()
+    cost_tracker = CostTracker()
+    for index in range(manifest["num_shards"]):
+        log_path = _shard_log(work_dir, index)
+        if not log_path.exists():
+            continue
+        # A resumed shard may log a test twice (failed, then rerun); keep the last entry
+        shard_results = {}
+        for result in load_run_results(log_path):
+            shard_results[result["test_id"]] = result
+        for test_id in sorted(shard_results):
+            sink.write(shard_results[test_id])
+            usage_stats.add_result(shard_results[test_id])
+            cost_tracker.add(shard_results[test_id].get("cost"))
+            if keep_results:
+                results[test_id] = shard_results[test_id]
+    summary = {}
+    if usage_stats.summary():
+        summary["usage"] = usage_stats.summary()
+    if cost_tracker.total_tokens:
+        summary["cost"] = cost_tracker.summary()
+    sink.close(summary=summary or None)
+    return results
+
+def _worker(work_dir: str, rate_limit_share: float) -> List[int]:
+    return run_available_shards(work_dir, rate_limit_share)
+
+async def run_sharded(
+    runner: TestRunner,
+    conversations: List[LLMConversation],
+    num_workers: int,
+    max_turns: int = 20,
+    logs_dir: Optional[Union[str, Path]] = None,
+    work_dir: Optional[Union[str, Path]] = None,
+    keep_results: bool = True
+) -> Dict[Any, Dict]:
+    """Run conversations across num_workers local processes and merge the results."""
+    logs_path = Path(logs_dir) if logs_dir else get_default_logs_dir()
+    work_dir = Path(work_dir) if work_dir else logs_path / f"shards_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+    
+    if not (work_dir / MANIFEST_NAME).exists():
+        prepare_shards(conversations, work_dir, num_workers, runner, max_turns, first_test_id=runner.test_counter + 1)
+    runner.test_counter += len(conversations)
+    
+    # Spawn rather than fork: workers must not inherit this process's event loop or sockets
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        await asyncio.gather(*[
+            loop.run_in_executor(pool, _worker, str(work_dir), 1.0 / num_workers)
+            for _ in range(num_workers)
+        ])
+    
+    return merge_shards(work_dir, logs_path, keep_results)
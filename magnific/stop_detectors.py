@@ -0,0 +1,125 @@
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from magnific.conversation import LLMConversation, Turn
+
+_WORD = re.compile(r"\w+")
+
+def _words(text: Optional[str]) -> set:
+    return set(_WORD.findall((text or "").lower()))
+
+def similarity(a: Optional[str], b: Optional[str]) -> float:
+    """Jaccard similarity of the word sets of two messages (1.0 for identical wording)."""
+    words_a, words_b = _words(a), _words(b)
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+def _recent_turns(conversation: "LLMConversation", count: int, speaker: Optional[str] = None) -> List["Turn"]:
+    """Last count generated turns (optionally of one speaker), oldest first; the scripted first message is skipped."""
+    recent = []
+    turns = conversation.turns
+    for index in range(len(turns) - 1, 0, -1):
+        turn = turns[index]
+        if speaker is None or turn.speaker == speaker:
+            recent.append(turn)
+            if len(recent) == count:
+                break
+    return recent[::-1]
+
+class StopDetector(ABC):
+    """Decides after each turn whether a conversation has stopped going anywhere.
+    Detectors are stateless so one instance can be shared by many conversations."""
+    reason: str = "detector"
+
+    @abstractmethod
+    def check(self, conversation: "LLMConversation", turn: "Turn") -> Optional[str]:
+        """Return a short explanation if the conversation should stop after turn, else None."""
+        pass
+
+@dataclass(frozen=True)
+class RepetitionDetector(StopDetector):
+    """Stops when a speaker's last `repeats` replies each closely repeat the one before."""
+    threshold: float = 0.85
+    repeats: int = 2
+    reason = "repetition"
+
+    def check(self, conversation, turn):
+        recent = _recent_turns(conversation, self.repeats + 1, speaker=turn.speaker)
+        if len(recent) <= self.repeats:
+            return None
+        if all(similarity(a.content, b.content) >= self.threshold for a, b in zip(recent, recent[1:])):
+            return f"{turn.speaker} repeated itself {self.repeats} times"
+        return None
+
+DEFAULT_GOODBYE_PHRASES = (
+    "bye", "goodbye", "good bye", "have a great day", "have a nice day",
+    "have a good day",
+)
+
+# Also common mid-sentence ("take care of my order", "I see you ordered..."), so these
+# only count as a farewell when they end the reply
+DEFAULT_CLOSING_PHRASES = (
+    "take care", "see you", "see you soon", "see you later",
+)
+
+@lru_cache(maxsize=None)
+def _phrase_pattern(phrases: Tuple[str, ...], at_end: bool = False) -> re.Pattern:
+    end = r"\W*$" if at_end else r"\b"
+    return re.compile("|".join(rf"\b{re.escape(phrase)}{end}" for phrase in phrases))
+
+@dataclass(frozen=True)
+class GoodbyeDetector(StopDetector):
+    """Stops once the last `turns` turns, from both speakers, are all farewells: a reply
+    containing one of `phrases`, or ending with one of `closing_phrases`."""
+    phrases: Tuple[str, ...] = DEFAULT_GOODBYE_PHRASES
+    closing_phrases: Tuple[str, ...] = DEFAULT_CLOSING_PHRASES
+    turns: int = 2
+    reason = "goodbye"
+
+    def _is_goodbye(self, content: Optional[str]) -> bool:
+        text = (content or "").lower()
+        return (
+            (bool(self.phrases) and _phrase_pattern(self.phrases).search(text) is not None)
+            or (bool(self.closing_phrases) and _phrase_pattern(self.closing_phrases, at_end=True).search(text) is not None)
+        )
+
+    def check(self, conversation, turn):
+        recent = _recent_turns(conversation, self.turns)
+        if len(recent) < self.turns or len({t.speaker for t in recent}) < 2:
+            return None
+        if all(self._is_goodbye(t.content) for t in recent):
+            return "both agents said goodbye"
+        return None
+
+@dataclass(frozen=True)
+class EmptyResponseDetector(StopDetector):
+    """Stops after `streak` consecutive empty or whitespace-only replies."""
+    streak: int = 2
+    reason = "empty_responses"
+
+    def check(self, conversation, turn):
+        recent = _recent_turns(conversation, self.streak)
+        if len(recent) == self.streak and all(not (t.content or "").strip() for t in recent):
+            return f"{self.streak} empty replies in a row"
+        return None
+
+@dataclass(frozen=True)
+class TokenCeilingDetector(StopDetector):
+    """Stops once the conversation has used max_tokens input plus output tokens."""
+    max_tokens: int
+    reason = "token_ceiling"
+
+    def check(self, conversation, turn):
+        used = sum((t.input_tokens or 0) + (t.output_tokens or 0) for t in conversation.turns)
+        if used >= self.max_tokens:
+            return f"used {used} tokens (ceiling {self.max_tokens})"
+        return None
+
+def default_stop_detectors() -> List[StopDetector]:
+    """Repetition, goodbye and empty-reply detectors with their default settings."""
+    return [RepetitionDetector(), GoodbyeDetector(), EmptyResponseDetector()]
@@ -1,23 +1,119 @@
 import asyncio
-from typing import List, Dict, Any
+import math
+import os
+import re
+from typing import AsyncIterator, List, Dict, Any, Optional
 from openai import AsyncOpenAI
 import json
-from dataclasses import dataclass
-from magnific.llm_config import LLMConfig
-import math
+from dataclasses import dataclass, field
+from magnific.llm_config import LLMConfig, RetryPolicy
+from magnific.clients import get_async_client
+from magnific.dedup import MinHashDeduplicator
+from magnific.retry import call_with_retry_async, get_status_code, is_retryable
+
+SCENARIO_FIELDS = ("type", "customer_prompt", "first_message", "description")
+
+# Strict JSON schema for OpenAI structured outputs; the top level must be an object
+SCENARIOS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "scenarios": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string", "enum": ["inbound", "outbound"]},
+                    "customer_prompt": {"type": "string"},
+                    "first_message": {"type": "string"},
+                    "description": {"type": "string"}
+                },
+                "required": list(SCENARIO_FIELDS),
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["scenarios"],
+    "additionalProperties": False
+}
+
+_CODE_FENCE = re.compile(r"```(?:json)?")
+
+def _rejects_response_format(exc: BaseException) -> bool:
+    """Whether the API refused the request's response_format (e.g. json_schema on gpt-3.5-turbo, anything on o1-mini)."""
+    return get_status_code(exc) == 400 and ("response_format" in str(exc) or "json_schema" in str(exc))
+
+def _valid_scenario(value: Any) -> Optional[Dict[str, Any]]:
+    """value as a scenario, or None if it lacks a field a conversation needs."""
+    if not isinstance(value, dict):
+        return None
+    if not all(isinstance(value.get(name), str) and value[name].strip() for name in ("customer_prompt", "first_message")):
+        return None
+    call_type = str(value.get("type", "")).strip().lower()
+    if call_type not in ("inbound", "outbound"):
+        return None
+    return {**value, "type": call_type, "description": str(value.get("description") or "")}
+
+def parse_scenarios(content: Optional[str]) -> List[Dict[str, Any]]:
+    """Every valid scenario in a model reply. Accepts a JSON array, a {"scenarios": [...]} object
+    or a single scenario, with or without code fences or surrounding prose. When the JSON as a whole
+    is broken (e.g. a truncated reply), each complete scenario object in it is still recovered."""
+    text = _CODE_FENCE.sub("", content or "").strip()
+    decoder = json.JSONDecoder()
+    scenarios = []
+    position = 0
+    while True:
+        # Decode the next complete JSON value; on failure, retry from the next nested { or [
+        starts = [index for index in (text.find("{", position), text.find("[", position)) if index != -1]
+        if not starts:
+            break
+        start = min(starts)
+        try:
+            value, end = decoder.raw_decode(text, start)
+        except ValueError:
+            position = start + 1
+            continue
+        if isinstance(value, dict) and isinstance(value.get("scenarios"), list):
+            value = value["scenarios"]
+        for item in value if isinstance(value, list) else [value]:
+            scenario = _valid_scenario(item)
+            if scenario is not None:
+                scenarios.append(scenario)
+        position = end
+    return scenarios
 
 @dataclass
 class SyntheticDataConfig:
     service_prompt: str
     model: str
     num_tests: int
-    max_threads: int = 5
+    max_threads: int = 5  # batch requests in flight at once
     temperature: float = 0.8
+    batch_size: int = 10  # scenarios requested per call
+    # Transient API errors are retried per request by retry_policy; a batch that still fails
+    # or returns unusable output is requested again up to max_batch_attempts times
+    retry_policy: RetryPolicy = field(default_factory=RetryPolicy)
+    max_batch_attempts: int = 3
+    # Ask for SCENARIOS_SCHEMA through response_format. If the model rejects it, fall back to
+    # JSON mode and then to no response_format for the rest of the run
+    structured_output: bool = True
+    # Scenarios whose customer_prompt and first_message are at least this similar (estimated
+    # Jaccard similarity of word shingles) to an earlier one are dropped; None keeps them all
+    dedup_threshold: Optional[float] = 0.7
+    # Batches are added until num_tests unique scenarios exist, up to this many (default 3x the minimum)
+    max_batches: Optional[int] = None
 
 class SyntheticDataGenerator:
     def __init__(self, config: SyntheticDataConfig):
         self.config = config
-        self.client = AsyncOpenAI()
+        # response_format values to try, most structured first; one the model rejects is dropped
+        self.response_formats: List[Optional[Dict[str, Any]]] = [
+            {"type": "json_schema", "json_schema": {"name": "scenarios", "strict": True, "schema": SCENARIOS_SCHEMA}},
+            {"type": "json_object"},
+            None
+        ] if config.structured_output else [None]
+        # Counts for the last stream() run
+        self.batches = 0
+        self.duplicates = 0
         
         self.system_prompt = """You are a synthetic data generator for customer service scenarios. Your task is to create diverse customer profiles and their initial messages for testing a customer service agent.
 
@@ -42,56 +138,112 @@ Your tone is <emotional state>.
 Try to <objective>.
 IMPORTANT: Use the tool end_call() only when you are satisfied with <success condition>."
 
-Respond with an array of JSON objects, each representing a unique customer scenario."""
+Respond with a JSON object whose "scenarios" field is an array of these objects, each representing a unique customer scenario."""
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # Shared per event loop, so reuse the evaluator's warm connections
+        return get_async_client(AsyncOpenAI, os.getenv("OPENAI_API_KEY") or "")
 
     async def _generate_batch(self, batch_size: int) -> List[Dict[str, Any]]:
-        """Generate a batch of synthetic customer configs"""
-        try:
-            response = await self.client.chat.completions.create(
-                model=self.config.model,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": f"""Given this service agent prompt:
+        """Generate a batch of synthetic customer configs. Malformed scenarios are dropped;
+        raises if the request fails or no scenario can be recovered from the reply."""
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": f"""Given this service agent prompt:
 
 {self.config.service_prompt}
 
 Generate {batch_size} diverse customer scenarios that would interact with this service agent. 
 Make sure the scenarios are realistic and test different aspects of the service agent's capabilities.
 Ensure the customer prompts align with the service context while maintaining diversity in customer needs and behaviors."""}
-                ],
-                temperature=self.config.temperature,
-            )
-            
-            # Parse the JSON response
-            content = response.choices[0].message.content
-            return json.loads(content)
-        except Exception as e:
-            print(f"Error generating batch: {e}")
-            return []
+        ]
+        while True:
+            response_format = self.response_formats[0]
+            extra = {"response_format": response_format} if response_format else {}
+            try:
+                response = await call_with_retry_async(
+                    lambda: self.client.chat.completions.create(
+                        model=self.config.model,
+                        messages=messages,
+                        temperature=self.config.temperature,
+                        **extra
+                    ),
+                    self.config.retry_policy
+                )
+                break
+            except Exception as e:
+                if response_format is None or not _rejects_response_format(e):
+                    raise
+                # Concurrent batches hit the same rejection; only the first drops the format
+                if self.response_formats[0] is response_format:
+                    self.response_formats.pop(0)
+                    fallback = self.response_formats[0]["type"] if self.response_formats[0] else "no response_format"
+                    print(f"{self.config.model} rejected response_format {response_format['type']}; falling back to {fallback}")
+        
+        # Parse the JSON response, keeping whatever scenarios survive a malformed reply
+        content = response.choices[0].message.content
+        scenarios = parse_scenarios(content)
+        if not scenarios:
+            raise ValueError(f"No valid scenarios in response: {(content or '')[:200]!r}")
+        return scenarios
+
+    async def _generate_batch_with_retries(self, batch_size: int) -> List[Dict[str, Any]]:
+        """_generate_batch, requested again on failure; [] once max_batch_attempts are used up.
+        Errors another request can't fix (bad request, auth, unknown model) are raised at once."""
+        for attempt in range(1, self.config.max_batch_attempts + 1):
+            try:
+                return await self._generate_batch(batch_size)
+            except Exception as e:
+                # ValueError is an unusable reply, which a fresh sample may fix
+                if not isinstance(e, ValueError) and not is_retryable(e):
+                    raise
+                print(f"Error generating batch (attempt {attempt}/{self.config.max_batch_attempts}): {e}")
+        return []
+
+    async def stream(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield unique scenarios as soon as their batch arrives, until num_tests have been yielded.
+        Up to max_threads batches are in flight, and a new one starts whenever one finishes,
+        so one slow batch never holds up the others. Scenarios lost to duplicates or failed
+        batches are requested again, up to max_batches batches in total."""
+        num_tests = self.config.num_tests
+        max_batches = self.config.max_batches or 3 * math.ceil(num_tests / self.config.batch_size)
+        dedup = MinHashDeduplicator(threshold=self.config.dedup_threshold) if self.config.dedup_threshold is not None else None
+        self.batches = 0
+        self.duplicates = 0
+        remaining = num_tests  # scenarios not yet covered by a started batch
+        yielded = 0
+        in_flight: Dict[asyncio.Task, int] = {}  # batch -> scenarios requested
+        try:
+            while yielded < num_tests:
+                while remaining > 0 and len(in_flight) < self.config.max_threads and self.batches < max_batches:
+                    batch_size = min(self.config.batch_size, remaining)
+                    remaining -= batch_size
+                    self.batches += 1
+                    in_flight[asyncio.create_task(self._generate_batch_with_retries(batch_size))] = batch_size
+                if not in_flight:
+                    break  # every batch has finished
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    accepted = 0
+                    for scenario in task.result():
+                        if yielded >= num_tests:
+                            break
+                        if dedup is not None and not dedup.add(f"{scenario['customer_prompt']}\n{scenario['first_message']}"):
+                            self.duplicates += 1
+                            continue
+                        accepted += 1
+                        yielded += 1
+                        yield scenario
+                    # Ask again for whatever this batch fell short by (or less, if it overdelivered)
+                    remaining += in_flight.pop(task) - accepted
+            if yielded < num_tests:
+                print(f"Warning: only {yielded} of {num_tests} unique scenarios after {self.batches} batches")
+        finally:
+            # The caller stopped early or we have enough; don't pay for batches still running
+            for task in in_flight:
+                task.cancel()
 
     async def generate(self) -> List[Dict[str, Any]]:
         """Generate synthetic customer configurations"""
-        # Calculate number of batches needed (max 10 scenarios per batch)
-        batch_size = 10
-        num_batches = math.ceil(self.config.num_tests / batch_size)
-        scenarios_per_batch = min(batch_size, self.config.num_tests)
-        
-        # Create batches with limited concurrency
-        all_scenarios = []
-        for i in range(0, num_batches, self.config.max_threads):
-            batch_tasks = []
-            for j in range(min(self.config.max_threads, num_batches - i)):
-                remaining = self.config.num_tests - len(all_scenarios)
-                if remaining <= 0:
-                    break
-                current_batch_size = min(scenarios_per_batch, remaining)
-                batch_tasks.append(self._generate_batch(current_batch_size))
-            
-            if batch_tasks:
-                batch_results = await asyncio.gather(*batch_tasks)
-                for scenarios in batch_results:
-                    all_scenarios.extend(scenarios)
-                    if len(all_scenarios) >= self.config.num_tests:
-                        break
-        
-        return all_scenarios[:self.config.num_tests] 
\ No newline at end of file
+        return [scenario async for scenario in self.stream()]
@@ -1,123 +1,689 @@
 import asyncio
-from typing import List, Dict, Any, Optional
+import json
+import time
+from datetime import datetime
+from typing import Callable, List, Dict, Any, Optional, Tuple, Union
 from magnific.conversation import LLMConversation
+from magnific.evaluation import Evaluation
+from magnific.llm_config import RateLimit
+from magnific.cache import SQLiteCache
+from magnific.usage import UsageStats, format_summary
+from magnific.pricing import ModelPrice, Budget, CostTracker, cost_breakdown, format_cost
 from magnific.evaluators.evalrunner import LlmEvaluator
+from magnific.evaluators.batch import BatchBackend, TERMINAL_STATUSES, write_batch_file
 from magnific.evaluators.evaluator import (
-    save_results_to_csv, 
-    save_run_details_to_json,
-    EvaluationResult
+    ResultSink,
+    get_default_logs_dir,
+    iter_latest_results,
+    load_run_results,
+    rebuild_run_outputs,
+    EvaluationResponse
 )
 from pathlib import Path
 
 class TestResult:
     def __init__(self, test_id: int, call_type: str, transcript: str, evaluation_results: List[Dict], 
-                 service_config: Dict, customer_config: Dict):
+                 service_config: Dict, customer_config: Dict, error: Optional[str] = None,
+                 request_attempts: Optional[List[Dict]] = None, fingerprint: Optional[str] = None,
+                 first_message: Optional[str] = None, turns: Optional[List[Dict]] = None,
+                 stop_reason: Optional[str] = None, usage: Optional[Dict] = None,
+                 cost: Optional[Dict] = None, stop_detail: Optional[str] = None,
+                 evaluation_status: Optional[str] = None):
         self.test_id = test_id
         self.call_type = call_type
         self.transcript = transcript
         self.evaluation_results = evaluation_results
         self.service_config = service_config
         self.customer_config = customer_config
+        self.error = error
+        self.request_attempts = request_attempts or []
+        self.fingerprint = fingerprint
+        self.first_message = first_message
+        self.turns = turns or []
+        self.stop_reason = stop_reason
+        self.stop_detail = stop_detail
+        self.usage = usage or {}
+        self.cost = cost
+        # "deferred" while the judge's verdicts are waiting in a batch
+        self.evaluation_status = evaluation_status
 
     def to_dict(self) -> Dict[str, Any]:
         return {
             "test_id": self.test_id,
             "call_type": self.call_type,
+            "first_message": self.first_message,
             "transcript": self.transcript,
+            "turns": self.turns,
+            "stop_reason": self.stop_reason,
+            "stop_detail": self.stop_detail,
+            "usage": self.usage,
+            "cost": self.cost,
             "evaluation_results": self.evaluation_results,
+            "evaluation_status": self.evaluation_status,
             "service_config": {
+                "provider": self.service_config.get("provider"),
                 "params": self.service_config["params"],
                 "system_prompt": self.service_config["system_prompt"],
                 "end_call_enabled": self.service_config["end_call_enabled"]
             },
             "customer_config": {
+                "provider": self.customer_config.get("provider"),
                 "params": self.customer_config["params"],
                 "system_prompt": self.customer_config["system_prompt"],
                 "end_call_enabled": self.customer_config["end_call_enabled"]
-            }
+            },
+            "error": self.error,
+            "request_attempts": self.request_attempts,
+            "fingerprint": self.fingerprint
         }
 
+class TokenBucket:
+    """Token bucket refilled continuously up to a per-minute capacity."""
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0  # tokens per second
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0):
+        # Requests larger than the bucket would never fit, so cap them at a full bucket
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+class RequestScheduler:
+    """Bounds concurrent conversations and paces requests per (provider, model).
+
+    Rate limits are looked up by "<ProviderClass>:<model>", then "<ProviderClass>",
+    falling back to the rate_limit set on the provider's LLMConfig.
+    """
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        rate_limits: Optional[Dict[str, RateLimit]] = None,
+        rate_limit_share: float = 1.0,
+        budget: Optional[Budget] = None
+    ):
+        self.max_concurrency = max_concurrency
+        self.rate_limits = rate_limits or {}
+        # Fraction of each quota this scheduler may use, when several processes share it
+        self.rate_limit_share = rate_limit_share
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.buckets: Dict[Tuple[str, str], Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        # Spending cap reserved before, and charged after, every agent and judge request
+        self.budget = budget
+
+    def reserve_budget(self, model: Optional[str], messages: List[Dict], params: Dict) -> Optional[Tuple[float, int]]:
+        """Hold the estimated cost of a request against the budget, or raise BudgetExhausted.
+        Release the returned reservation with release_budget once the request is done."""
+        if self.budget is None:
+            return None
+        return self.budget.reserve(model, *self._estimate(messages, params))
+
+    def release_budget(self, reservation: Optional[Tuple[float, int]]) -> None:
+        if self.budget is not None:
+            self.budget.release(reservation)
+
+    def charge(self, model: Optional[str], tokens: Dict[str, Any]) -> None:
+        if self.budget is not None:
+            self.budget.charge(model, tokens)
+
+    def slot(self):
+        """Context manager holding one of the global concurrency slots."""
+        return self.semaphore if self.semaphore is not None else _NullSlot()
+
+    def _resolve_limit(self, provider_name: str, model: str, config_limit: Optional[RateLimit]) -> Optional[RateLimit]:
+        return (
+            self.rate_limits.get(f"{provider_name}:{model}")
+            or self.rate_limits.get(provider_name)
+            or config_limit
+        )
+
+    def _get_buckets(self, provider_name: str, model: str, config_limit: Optional[RateLimit]):
+        key = (provider_name, model)
+        if key not in self.buckets:
+            limit = self._resolve_limit(provider_name, model, config_limit)
+            share = self.rate_limit_share
+            request_bucket = TokenBucket(max(1, int(limit.requests_per_minute * share))) if limit and limit.requests_per_minute else None
+            token_bucket = TokenBucket(max(1, int(limit.tokens_per_minute * share))) if limit and limit.tokens_per_minute else None
+            self.buckets[key] = (request_bucket, token_bucket)
+        return self.buckets[key]
+
+    @staticmethod
+    def _estimate(messages: List[Dict], params: Dict) -> Tuple[int, int]:
+        """Rough (input, output) tokens of a request: ~4 characters per input token, and the output budget."""
+        input_tokens = sum(len(str(m.get("content") or "")) for m in messages) // 4
+        output_tokens = params.get("max_tokens") or params.get("max_completion_tokens") or 0
+        return input_tokens, output_tokens
+
+    @staticmethod
+    def estimate_tokens(messages: List[Dict], params: Dict) -> int:
+        """Rough request size: ~4 characters per input token plus the output budget."""
+        return sum(RequestScheduler._estimate(messages, params))
+
+    async def throttle(self, provider_name: str, model: str, messages: List[Dict], params: Dict, config_limit: Optional[RateLimit] = None):
+        """Wait until the provider/model quota allows one more request of this size."""
+        request_bucket, token_bucket = self._get_buckets(provider_name, model, config_limit)
+        if request_bucket is not None:
+            await request_bucket.acquire(1)
+        if token_bucket is not None:
+            await token_bucket.acquire(self.estimate_tokens(messages, params))
+
+    async def throttle_provider(self, provider, messages: List[Dict]):
+        config = provider.config
+        await self.throttle(
+            provider.name,
+            config.params.get("model", ""),
+            messages,
+            config.params,
+            config.rate_limit
+        )
+
+class _NullSlot:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
 class TestRunner:
-    def __init__(self, eval_model: str = "gpt-4o"):
+    def __init__(
+        self,
+        eval_model: str = "gpt-4o",
+        max_concurrency: Optional[int] = None,
+        rate_limits: Optional[Dict[str, RateLimit]] = None,
+        judge_cache: Optional[SQLiteCache] = None,
+        batch_judging: bool = False,
+        judge_batch_backend: Optional[BatchBackend] = None,
+        pricing: Optional[Dict[str, ModelPrice]] = None,
+        max_cost: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ):
         self.eval_model = eval_model
         self.test_counter = 0  # Initialize counter for test IDs
+        # Global cap on in-flight conversations plus per-provider/model quotas
+        self.max_concurrency = max_concurrency
+        self.rate_limits = rate_limits or {}
+        # Set below 1.0 by sharded workers so their combined traffic stays within quota
+        self.rate_limit_share = 1.0
+        # Optional persistent cache of judge verdicts shared by every test
+        self.judge_cache = judge_cache
+        self.judge_cache_stats = {"hits": 0, "misses": 0}
+        self.usage_stats = UsageStats()
+        # Judge all criteria of a test in one call instead of one call per Evaluation
+        self.batch_judging = batch_judging
+        # When set, judge requests are written to a Batch API file instead of being sent
+        # interactively; collect them later with collect_deferred_evaluations
+        self.judge_batch_backend = judge_batch_backend
+        self.last_batch_manifest: Optional[Path] = None
+        self._deferred_requests: List[Dict] = []
+        self._deferred_entries: Dict[str, Dict] = {}
+        # Per-model prices overriding magnific.pricing.PRICING
+        self.pricing = pricing or {}
+        # Budget in USD / tokens for one run_tests call. It is charged after every request, and once
+        # spent no new conversation, turn or judge call starts; interrupted tests are recorded as errors.
+        self.max_cost = max_cost
+        self.max_tokens = max_tokens
+        self.cost_tracker = CostTracker()
+        self._budget = Budget(max_cost, max_tokens, self.pricing)
+        self.budget_skipped = 0
 
     async def run_tests(
         self, 
         conversations: List[LLMConversation], 
         max_turns: int = 20,
         save_logs: bool = True,
-        logs_dir: Optional[Path] = None
+        logs_dir: Optional[Path] = None,
+        keep_results: bool = True,
+        resume_from: Optional[Union[str, Path]] = None,
+        run_name: Optional[str] = None,
+        test_ids: Optional[List[int]] = None,
+        result_callback: Optional[Callable[[Dict], None]] = None
     ) -> Dict[str, Dict]:
-        # Create tasks for all conversations sequentially
-        async with asyncio.TaskGroup() as tg:
-            tasks = []
-            for conv in conversations:
-                self.test_counter += 1
-                tasks.append(
-                    tg.create_task(self.run_single_test(conv, self.test_counter, max_turns))
-                )
+        """Run and evaluate all conversations concurrently.
         
-        # Collect results
-        results = {
-            task.result().test_id: task.result().to_dict()
-            for task in tasks
-        }
+        With save_logs, every result is streamed to a JSONL log and CSV as soon as its
+        test finishes. Set keep_results=False on very large suites to stop results
+        accumulating in memory; the returned dict is then empty and the logs are the output.
+        
+        resume_from takes the run_results JSONL (or run_details JSON) of an earlier run of
+        the same suite. Conversations that already finished there without error are skipped
+        and keep their results and test IDs. Tests whose deferred verdicts were never collected
+        are judged again from their logged transcript. When it is a run_results JSONL, new
+        results are appended to that log so the run's files stay complete.
+        
+        run_name replaces the timestamp in output file names. test_ids assigns explicit
+        IDs, one per conversation, instead of numbering from the runner's counter.
+        result_callback is called with each result dict as soon as its test finishes.
+        
+        When max_cost or max_tokens is set, every request reserves its estimated cost first.
+        Once the budget is spent or reserved, remaining conversations are skipped and left out
+        of the logs, and conversations and judging in flight stop before their next request and
+        are logged with a budget error. Continue the run later with resume_from.
+        """
+        # One scheduler per run so buckets and the semaphore belong to this event loop
+        self._budget = Budget(self.max_cost, self.max_tokens, self.pricing)
+        scheduler = RequestScheduler(self.max_concurrency, self.rate_limits, self.rate_limit_share, self._budget)
+        self.judge_cache_stats = {"hits": 0, "misses": 0}
+        self.usage_stats = UsageStats()
+        self.cost_tracker = CostTracker()
+        self.budget_skipped = 0
+        self._deferred_requests = []
+        self._deferred_entries = {}
         
-        # Save results if requested
+        previous = load_run_results(resume_from) if resume_from else []
+        pending, completed, unjudged = self._plan_resume(conversations, previous, test_ids)
+        
+        sink = None
         if save_logs:
-            # Save all tests to a single JSON file
-            json_path = save_run_details_to_json(
-                test_results=results,
-                logs_dir=logs_dir
-            )
-            
-            # Also save individual results to CSV for backward compatibility
-            for test_id, result in results.items():
-                eval_results = [
-                    EvaluationResult(**eval_dict)
-                    for eval_dict in result["evaluation_results"]
-                ]
-                
-                save_results_to_csv(
-                    model_type="LLM",
-                    model_name=result["service_config"]["params"].get("model", "unknown"),
-                    transcript=result["transcript"],
-                    evaluation_results=eval_results,
-                    logs_dir=logs_dir
+            evaluation_names = [evaluation.name for conv in conversations for evaluation in conv.evaluations]
+            resume_path = Path(resume_from) if resume_from else None
+            if resume_path is not None and resume_path.suffix == ".jsonl" and resume_path.stem.startswith("run_results_"):
+                # Continue the earlier run's log in place
+                sink = ResultSink(
+                    logs_dir=resume_path.parent,
+                    evaluation_names=evaluation_names,
+                    timestamp=resume_path.stem[len("run_results_"):]
                 )
+            else:
+                sink = ResultSink(logs_dir=logs_dir, evaluation_names=evaluation_names, timestamp=run_name)
+                for result_dict in completed:
+                    sink.write(result_dict)
+        results = {}
+        for result_dict in completed:
+            self.usage_stats.add_result(result_dict)
+            self.cost_tracker.add(result_dict.get("cost"))
+            if keep_results:
+                results[result_dict["test_id"]] = result_dict
+        if completed or unjudged:
+            print(f"Resuming: skipping {len(completed)} completed tests, judging {len(unjudged)}, running {len(pending)}")
+        
+        def record(result_dict: Dict):
+            self.usage_stats.add_result(result_dict)
+            self.cost_tracker.add(result_dict.get("cost"))
+            if sink is not None:
+                sink.write(result_dict)
+            if keep_results:
+                results[result_dict["test_id"]] = result_dict
+            if result_callback is not None:
+                result_callback(result_dict)
+        
+        def on_result(result: TestResult):
+            record(result.to_dict())
+        
+        # Create tasks for all conversations so they run concurrently
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for test_id, conv in pending:
+                    tg.create_task(self._run_scheduled(scheduler, conv, test_id, max_turns, on_result))
+                for result_dict, conv in unjudged:
+                    tg.create_task(self._judge_logged(scheduler, conv, result_dict, record))
+        except BaseException:
+            # Finish the run_details JSON from whatever completed before the failure
+            if sink is not None:
+                sink.close(summary=self._run_summary())
+            raise
+        
+        usage_summary = self.usage_stats.summary()
+        if usage_summary:
+            print(format_summary(usage_summary))
+        if self.cost_tracker.total_tokens:
+            print(format_cost(self.cost_tracker.summary()))
+        if self.budget_skipped:
+            print(f"Budget reached: skipped {self.budget_skipped} tests")
+        if self.judge_cache is not None:
+            print(f"Judge cache: {self.judge_cache_stats['hits']} hits, {self.judge_cache_stats['misses']} misses")
+        if self._deferred_entries:
+            self.last_batch_manifest = await self._submit_deferred_judging(logs_dir, sink.jsonl_path if sink is not None else None)
+            print(f"Judge requests submitted as a batch; manifest at {self.last_batch_manifest}")
+        
+        if sink is not None:
+            sink.close(summary=self._run_summary())
         
-        return results
+        # Keep results in test order regardless of completion order
+        return dict(sorted(results.items()))
 
-    async def run_single_test(self, conversation: LLMConversation, test_id: str, max_turns: int = 20) -> TestResult:
-        # Run conversation
-        conversation.have_conversation(max_turns=max_turns)
+    def _plan_resume(
+        self,
+        conversations: List[LLMConversation],
+        previous: List[Dict],
+        test_ids: Optional[List[int]] = None
+    ) -> Tuple[List[Tuple[int, LLMConversation]], List[Dict], List[Tuple[Dict, LLMConversation]]]:
+        """Match conversations against an earlier run's results by fingerprint.
+        Returns (test_id, conversation) pairs still to run, the results being kept, and
+        (result, conversation) pairs whose deferred verdicts were never collected."""
+        finished: Dict[str, List[Dict]] = {}
+        failed: Dict[str, List[Any]] = {}
+        deferred: Dict[str, List[Dict]] = {}
+        for result in previous:
+            fingerprint = result.get("fingerprint")
+            if fingerprint is None:
+                continue
+            if result.get("error"):
+                failed.setdefault(fingerprint, []).append(result["test_id"])
+            elif result.get("evaluation_status") == "deferred":
+                deferred.setdefault(fingerprint, []).append(result)
+            else:
+                finished.setdefault(fingerprint, []).append(result)
+            if isinstance(result["test_id"], int):
+                self.test_counter = max(self.test_counter, result["test_id"])
+        # A test that failed and later succeeded on resume must not be rerun again
+        for fingerprint, kept in finished.items():
+            done = {result["test_id"] for result in kept}
+            if fingerprint in failed:
+                failed[fingerprint] = [test_id for test_id in failed[fingerprint] if test_id not in done]
+        
+        pending, completed, unjudged = [], [], []
+        for index, conv in enumerate(conversations):
+            fingerprint = conv.fingerprint()
+            if finished.get(fingerprint):
+                completed.append(finished[fingerprint].pop(0))
+            elif deferred.get(fingerprint):
+                # The conversation is logged; only its verdicts are missing
+                unjudged.append((deferred[fingerprint].pop(0), conv))
+            elif failed.get(fingerprint):
+                # Rerun a failed test under its original ID
+                pending.append((failed[fingerprint].pop(0), conv))
+            elif test_ids is not None:
+                pending.append((test_ids[index], conv))
+            else:
+                self.test_counter += 1
+                pending.append((self.test_counter, conv))
+        return pending, completed, unjudged
+
+    async def run_tests_sharded(
+        self,
+        conversations: List[LLMConversation],
+        num_workers: int,
+        max_turns: int = 20,
+        logs_dir: Optional[Path] = None,
+        work_dir: Optional[Path] = None,
+        keep_results: bool = True
+    ) -> Dict[str, Dict]:
+        """Run conversations across num_workers processes, each with its own event loop and clients.
+        
+        Rate limits are divided evenly between workers. Rerunning with the same work_dir
+        resumes unfinished shards. See magnific.sharding for running shards on several machines.
+        """
+        from magnific.sharding import run_sharded
+        return await run_sharded(self, conversations, num_workers, max_turns, logs_dir, work_dir, keep_results)
+
+    def _run_summary(self) -> Optional[Dict[str, Any]]:
+        summary = {}
+        usage_summary = self.usage_stats.summary()
+        if usage_summary:
+            summary["usage"] = usage_summary
+        if self.cost_tracker.total_tokens:
+            summary["cost"] = self.cost_tracker.summary()
+        if self.max_cost is not None or self.max_tokens is not None:
+            summary["budget"] = {
+                "max_cost": self.max_cost,
+                "max_tokens": self.max_tokens,
+                "spent_cost": self._budget.cost,
+                "spent_tokens": self._budget.tokens,
+                "skipped": self.budget_skipped
+            }
+        if self.judge_cache is not None:
+            summary["judge_cache"] = self.judge_cache_stats
+        if self.last_batch_manifest is not None and self._deferred_entries:
+            summary["deferred_judging"] = {"manifest": str(self.last_batch_manifest)}
+        return summary or None
+
+    async def _run_scheduled(
+        self,
+        scheduler: RequestScheduler,
+        conversation: LLMConversation,
+        test_id: int,
+        max_turns: int,
+        on_result: Callable[[TestResult], None]
+    ) -> None:
+        async with scheduler.slot():
+            if self._budget.exhausted:
+                self.budget_skipped += 1
+                return
+            result = await self.run_single_test(conversation, test_id, max_turns, scheduler=scheduler)
+        on_result(result)
+
+    async def run_single_test(
+        self,
+        conversation: LLMConversation,
+        test_id: str,
+        max_turns: int = 20,
+        scheduler: Optional[RequestScheduler] = None
+    ) -> TestResult:
+        # Run conversation without blocking the event loop
+        conversation.scheduler = scheduler
+        await conversation.have_conversation_async(max_turns=max_turns)
         
         # Create a new evaluator for this test
-        evaluator = LlmEvaluator(model=self.eval_model)
+        evaluator = LlmEvaluator(
+            model=self.eval_model,
+            scheduler=scheduler,
+            cache=self.judge_cache,
+            batch_criteria=self.batch_judging
+        )
         
-        # Evaluate results
-        eval_response = await evaluator.evaluate(conversation)
-        evaluation_results = eval_response.evaluation_results if eval_response else []
+        # Evaluate results; skip the judge when the conversation was aborted by a provider error
+        error = conversation.error
+        evaluation_results, evaluation_status = [], None
+        if not conversation.error:
+            evaluation_results, error, evaluation_status = await self._judge(
+                evaluator, conversation.transcript, conversation.evaluations, test_id
+            )
         
         # Get configurations from providers
         service_config = {
+            "provider": conversation.service_provider.name,
             "params": conversation.service_provider.config.params,
             "system_prompt": conversation.service_provider.config.system_prompt,
             "end_call_enabled": conversation.service_provider.config.end_call_enabled
         }
         
         customer_config = {
+            "provider": conversation.customer_provider.name,
             "params": conversation.customer_provider.config.params,
             "system_prompt": conversation.customer_provider.config.system_prompt,
             "end_call_enabled": conversation.customer_provider.config.end_call_enabled
         }
         
+        turns = [turn.to_dict() for turn in conversation.turns]
+        usage = UsageStats()
+        usage.add_result({"turns": turns, "service_config": service_config, "customer_config": customer_config})
+        cost = cost_breakdown(
+            turns,
+            service_model=service_config["params"].get("model"),
+            customer_model=customer_config["params"].get("model"),
+            judge_usage=evaluator.usage,
+            judge_model=self.eval_model,
+            pricing=self.pricing
+        )
+        
         return TestResult(
             test_id=test_id,
             call_type=conversation.type,
             transcript=conversation.transcript,
-            evaluation_results=[result.dict() for result in evaluation_results],
+            evaluation_results=evaluation_results,
             service_config=service_config,
-            customer_config=customer_config
-        )
\ No newline at end of file
+            customer_config=customer_config,
+            error=error,
+            request_attempts=conversation.request_attempts,
+            fingerprint=conversation.fingerprint(),
+            first_message=conversation.first_message,
+            turns=turns,
+            stop_reason=conversation.stop_reason,
+            stop_detail=conversation.stop_detail,
+            usage=usage.summary(),
+            cost=cost,
+            evaluation_status=evaluation_status
+        )
+
+    async def _judge(
+        self,
+        evaluator: LlmEvaluator,
+        transcript: str,
+        evaluations: List[Evaluation],
+        test_id: Any
+    ) -> Tuple[List[Dict], Optional[str], Optional[str]]:
+        """Judge a finished transcript, or queue it for deferred judging.
+        Returns (evaluation_results, judge error, evaluation_status)."""
+        try:
+            if self.judge_batch_backend is not None:
+                # Deferred judging: queue the requests; verdicts are appended to the log on collection
+                requests, entry = await evaluator.build_transcript_batch_requests(transcript, evaluations, test_id)
+                entry["test_id"] = test_id
+                self._deferred_requests.extend(requests)
+                self._deferred_entries[str(test_id)] = entry
+                return [], None, "deferred"
+            try:
+                eval_response = await evaluator.evaluate_transcript(transcript, evaluations)
+            except Exception as e:
+                print(f"Error evaluating test {test_id}: {e}")
+                eval_response = None
+                evaluator.errors.append(repr(e))
+        finally:
+            self.judge_cache_stats["hits"] += evaluator.cache_hits
+            self.judge_cache_stats["misses"] += evaluator.cache_misses
+        # Judge failures are recorded like a conversation error, so resume_from judges the test again
+        error = "judge: " + "; ".join(evaluator.errors) if evaluator.errors else None
+        evaluation_results = eval_response.evaluation_results if eval_response else []
+        return [result.dict() for result in evaluation_results], error, None
+
+    async def _judge_logged(
+        self,
+        scheduler: RequestScheduler,
+        conversation: LLMConversation,
+        result: Dict,
+        record: Callable[[Dict], None]
+    ) -> None:
+        """Judge a logged test whose deferred verdicts were never collected, without rerunning its conversation."""
+        async with scheduler.slot():
+            if self._budget.exhausted:
+                self.budget_skipped += 1
+                return
+            evaluator = LlmEvaluator(
+                model=self.eval_model,
+                scheduler=scheduler,
+                cache=self.judge_cache,
+                batch_criteria=self.batch_judging
+            )
+            evaluation_results, error, evaluation_status = await self._judge(
+                evaluator, result["transcript"], conversation.evaluations, result["test_id"]
+            )
+        cost = cost_breakdown(
+            result.get("turns") or [],
+            service_model=result["service_config"]["params"].get("model"),
+            customer_model=result["customer_config"]["params"].get("model"),
+            judge_usage=evaluator.usage,
+            judge_model=self.eval_model,
+            pricing=self.pricing
+        )
+        record({
+            **result,
+            "evaluation_results": evaluation_results,
+            "evaluation_status": evaluation_status,
+            "error": error,
+            "cost": cost
+        })
+
+    async def _submit_deferred_judging(self, logs_dir: Optional[Path] = None, run_log: Optional[Path] = None) -> Path:
+        """Write queued judge requests to a batch file, submit it, and save a manifest for collection.
+        run_log is the run's JSONL log, which collection appends the judged results to."""
+        logs_path = Path(logs_dir) if logs_dir else get_default_logs_dir()
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        batch_id = None
+        input_path = None
+        if self._deferred_requests:
+            input_path = write_batch_file(self._deferred_requests, logs_path / f"judge_batch_{timestamp}.jsonl")
+            # Backends upload files or run requests and block; keep them off the event loop
+            batch_id = await asyncio.to_thread(self.judge_batch_backend.submit, input_path)
+        
+        manifest_path = self.last_batch_manifest = logs_path / f"judge_batch_{timestamp}.manifest.json"
+        manifest = {
+            "batch_id": batch_id,
+            "input_file": str(input_path) if input_path else None,
+            "eval_model": self.eval_model,
+            "run_log": str(run_log) if run_log else None,
+            # Written again into run_details when collection rebuilds it
+            "summary": self._run_summary(),
+            "tests": self._deferred_entries
+        }
+        with manifest_path.open("w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest_path
+
+    async def collect_deferred_evaluations(
+        self,
+        manifest_path: Optional[Path] = None,
+        results: Optional[Dict[Any, Dict]] = None,
+        poll_interval: float = 60.0,
+        timeout: Optional[float] = None
+    ) -> Dict[Any, EvaluationResponse]:
+        """Wait for a deferred judge batch and return an EvaluationResponse per test_id.
+        
+        The judged results are appended to the run's JSONL log, and its CSV and run_details
+        are rebuilt from it, so the logs end up with the verdicts even when run_tests kept
+        no results in memory. If results from run_tests are given, their evaluation_results
+        are filled in place too."""
+        manifest_path = Path(manifest_path or self.last_batch_manifest)
+        with manifest_path.open(encoding="utf-8") as f:
+            manifest = json.load(f)
+        
+        output_lines = {}
+        if manifest["batch_id"] is not None:
+            start = time.monotonic()
+            while True:
+                status = await asyncio.to_thread(self.judge_batch_backend.status, manifest["batch_id"])
+                if status in TERMINAL_STATUSES:
+                    break
+                if timeout is not None and time.monotonic() - start > timeout:
+                    raise TimeoutError(f"Batch {manifest['batch_id']} still {status} after {timeout}s")
+                await asyncio.sleep(poll_interval)
+            output_lines = {
+                line["custom_id"]: line
+                for line in await asyncio.to_thread(self.judge_batch_backend.output_lines, manifest["batch_id"])
+            }
+        
+        evaluator = LlmEvaluator(model=manifest["eval_model"], cache=self.judge_cache)
+        responses = {}
+        for entry in manifest["tests"].values():
+            test_id = entry["test_id"]
+            responses[test_id] = await evaluator.parse_batch_output(entry, output_lines)
+            if results is not None and test_id in results:
+                results[test_id]["evaluation_results"] = [
+                    result.dict() for result in responses[test_id].evaluation_results
+                ]
+                results[test_id]["evaluation_status"] = None
+        
+        run_log = Path(manifest["run_log"]) if manifest.get("run_log") else None
+        if run_log is not None and run_log.exists():
+            await asyncio.to_thread(self._append_collected, run_log, responses, manifest.get("summary"))
+        return responses
+
+    @staticmethod
+    def _append_collected(run_log: Path, responses: Dict[Any, EvaluationResponse], summary: Optional[Dict]) -> None:
+        """Append the judged version of each still-deferred test to run_log, then rebuild the CSV and run_details."""
+        by_id = {str(test_id): response for test_id, response in responses.items()}
+        judged = [
+            {
+                **result,
+                "evaluation_results": [r.dict() for r in by_id[str(result["test_id"])].evaluation_results],
+                "evaluation_status": None
+            }
+            for result in iter_latest_results(run_log)
+            # A test rerun or judged since the batch was submitted keeps its newer entry
+            if result.get("evaluation_status") == "deferred" and str(result["test_id"]) in by_id
+        ]
+        if not judged:
+            return
+        with run_log.open("a", encoding="utf-8") as f:
+            for result in judged:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        rebuild_run_outputs(run_log, summary)
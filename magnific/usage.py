@@ -0,0 +1,145 @@
+import math
+import time
+from dataclasses import dataclass, asdict, field
+from typing import Any, Dict, Iterable, List, Optional
+
+@dataclass
+class Usage:
+    """Timing and token usage of one provider request.
+
+    Attributes:
+        request_start (float): Unix time the request was sent
+        ttft (float): Seconds until the first token arrived (streaming only)
+        total (float): Seconds until the full response arrived
+        chunks (int): Number of content chunks received (streaming only)
+        mean_token_gap (float): Mean seconds between consecutive chunks (streaming only)
+        max_token_gap (float): Longest stall between consecutive chunks (streaming only)
+        input_tokens (int): Prompt tokens billed, including cached_tokens and cache_write_tokens
+        output_tokens (int): Completion tokens billed
+        cached_tokens (int): Prompt tokens served from the vendor's prompt cache
+        cache_write_tokens (int): Prompt tokens written to the vendor's prompt cache
+        cache_hit (bool): Whether the response came from a local CachedProvider
+    """
+    request_start: float = 0.0
+    ttft: Optional[float] = None
+    total: Optional[float] = None
+    chunks: int = 0
+    mean_token_gap: Optional[float] = None
+    max_token_gap: Optional[float] = None
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    cache_write_tokens: Optional[int] = None
+    cache_hit: bool = False
+    _started: float = field(default=0.0, repr=False, compare=False)
+    _last_token: Optional[float] = field(default=None, repr=False, compare=False)
+    _gap_total: float = field(default=0.0, repr=False, compare=False)
+
+    @classmethod
+    def begin(cls) -> "Usage":
+        return cls(request_start=time.time(), _started=time.perf_counter())
+
+    def mark_token(self) -> None:
+        """Record the arrival of a streamed chunk carrying text or a tool call."""
+        now = time.perf_counter()
+        if self._last_token is None:
+            self.ttft = now - self._started
+        else:
+            gap = now - self._last_token
+            self._gap_total += gap
+            self.max_token_gap = max(self.max_token_gap or 0.0, gap)
+            self.mean_token_gap = self._gap_total / self.chunks
+        self._last_token = now
+        self.chunks += 1
+
+    def end(self) -> "Usage":
+        self.total = time.perf_counter() - self._started
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        for name in ("_started", "_last_token", "_gap_total"):
+            data.pop(name)
+        return data
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """q-th percentile (0-100) with linear interpolation between closest ranks."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    if low == high:
+        return ordered[low]
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def summarize(values: Iterable[Optional[float]]) -> Dict[str, Optional[float]]:
+    values = [v for v in values if v is not None]
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+class UsageStats:
+    """Collects per-turn latency and token counts, grouped by a key such as "service_agent:gpt-4o"."""
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = {}
+        self.ttft: Dict[str, List[float]] = {}
+        self.max_token_gap: Dict[str, List[float]] = {}
+        self.tokens: Dict[str, Dict[str, int]] = {}
+
+    def add_turn(self, key: str, turn: Dict[str, Any]) -> None:
+        if turn.get("latency") is None:
+            return  # the scripted first message was not generated
+        totals = self.tokens.setdefault(key, {"input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0, "turns": 0, "cache_hits": 0})
+        totals["turns"] += 1
+        if turn.get("cache_hit"):
+            # A replayed reply's timing is a local lookup, not the provider's, so keep it out of the percentiles
+            totals["cache_hits"] += 1
+            return
+        self.latency.setdefault(key, []).append(turn["latency"])
+        if turn.get("ttft") is not None:
+            self.ttft.setdefault(key, []).append(turn["ttft"])
+        if turn.get("max_token_gap") is not None:
+            self.max_token_gap.setdefault(key, []).append(turn["max_token_gap"])
+        for name in ("input_tokens", "output_tokens", "cached_tokens", "cache_write_tokens"):
+            totals[name] += turn.get(name) or 0
+
+    def add_result(self, result: Dict[str, Any]) -> None:
+        """Add every generated turn of a test result dict, keyed by speaker and model."""
+        configs = {
+            "service_agent": result.get("service_config") or {},
+            "customer_agent": result.get("customer_config") or {},
+        }
+        for turn in result.get("turns") or []:
+            params = configs.get(turn["speaker"], {}).get("params") or {}
+            self.add_turn(f"{turn['speaker']}:{params.get('model', 'unknown')}", turn)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            key: {
+                "latency": summarize(self.latency.get(key, [])),
+                "ttft": summarize(self.ttft.get(key, [])),
+                "max_token_gap": summarize(self.max_token_gap.get(key, [])),
+                **self.tokens[key]
+            }
+            for key in self.tokens
+        }
+
+def format_summary(summary: Dict[str, Dict[str, Any]]) -> str:
+    def seconds(value: Optional[float]) -> str:
+        return f"{value:.2f}s" if value is not None else "-"
+    lines = []
+    for key, stats in summary.items():
+        latency, ttft, gap = stats["latency"], stats["ttft"], stats["max_token_gap"]
+        lines.append(
+            f"{key}: latency p50 {seconds(latency['p50'])} p95 {seconds(latency['p95'])} p99 {seconds(latency['p99'])}"
+            f" | ttft p50 {seconds(ttft['p50'])} p95 {seconds(ttft['p95'])}"
+            f" | max gap p95 {seconds(gap['p95'])}"
+            f" | tokens in {stats['input_tokens']} (cached {stats['cached_tokens']}, cache writes {stats['cache_write_tokens']}) out {stats['output_tokens']}"
+            + (f" | {stats['cache_hits']} of {stats['turns']} turns replayed from cache" if stats.get("cache_hits") else "")
+        )
+    return "\n".join(lines)
@@ -15,6 +15,10 @@ setup(
         "typing",
         "dataclasses",
     ],
+    extras_require={
+        # HTTP/2 for the shared client connection pools
+        "http2": ["httpx[http2]"],
+    },
     author="Austin Wang, Prithvi Balehannina",
     author_email="austinwa@seas.upenn.edu, bprithvi@wharton.upenn.edu",
     description="A package for evaluating LLMs in customer service scenarios",
@@ -32,6 +36,8 @@ setup(
     entry_points={
         'console_scripts': [
             'magnific-serve=magnific.cli.serve:main',
+            'magnific-shard-worker=magnific.cli.shard_worker:main',
+            'magnific-job-worker=magnific.cli.job_worker:main',
         ],
     },
 ) 
\ No newline at end of file
@@ -1,7 +1,9 @@
 import React, { useState } from 'react';
 import { PromptSection } from './components/PromptSection';
 import { DataTable } from './components/DataTable';
-import { ModelConfig, RunDetails, TestResult } from './types';
+import { JobProgress, ModelConfig, RunDetails, TestResult } from './types';
+
+const API_URL = 'http://localhost:8000';
 
 function App() {
   const [config, setConfig] = useState<ModelConfig>({
@@ -17,37 +19,83 @@ function App() {
   const [isLoading, setIsLoading] = useState(false);
   const [testResults, setTestResults] = useState<TestResult[]>([]);
   const [isSyntheticLoading, setIsSyntheticLoading] = useState(false);
+  const [progress, setProgress] = useState<JobProgress | null>(null);
 
   const handleSave = () => {
     // TODO: Implement save functionality
     console.log('Saving configuration:', config);
   };
 
-  const handleRun = async () => {
-    setIsLoading(true);
-    try {
-      const response = await fetch('http://localhost:8000/api/rerun', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          config,
-          test_results: testResults,
-        }),
+  // Queue a rerun job and stream its results into the table as each test finishes.
+  // Resolves with the job's final status ("completed" or "cancelled").
+  const runJob = async (tests: any[]): Promise<string> => {
+    const response = await fetch(`${API_URL}/api/rerun`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({
+        config,
+        test_results: tests,
+      }),
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to start rerun');
+    }
+
+    const { job_id, total } = await response.json();
+    setProgress({ job_id, completed: 0, total });
+
+    return new Promise<string>((resolve, reject) => {
+      const events = new EventSource(`${API_URL}/api/jobs/${job_id}/events`);
+      events.addEventListener('result', (event) => {
+        const data = JSON.parse((event as MessageEvent).data);
+        const result = data.result as TestResult;
+        setProgress({ job_id, completed: data.completed, total: data.total });
+        setTestResults(prev => {
+          const index = prev.findIndex(test => test.test_id === result.test_id);
+          if (index === -1) {
+            return [...prev, result];
+          }
+          const next = [...prev];
+          next[index] = result;
+          return next;
+        });
+      });
+      events.addEventListener('done', (event) => {
+        events.close();
+        const job = JSON.parse((event as MessageEvent).data);
+        if (job.status === 'failed') {
+          reject(new Error(job.error || 'Job failed'));
+        } else {
+          resolve(job.status);
+        }
       });
+      events.onerror = () => {
+        // EventSource reconnects on its own while the stream is open; give up once it is closed
+        if (events.readyState === EventSource.CLOSED) {
+          reject(new Error('Lost connection to job events'));
+        }
+      };
+    }).finally(() => setProgress(null));
+  };
 
-      if (!response.ok) {
-        throw new Error('Failed to re-run evaluations');
-      }
+  const handleCancel = async () => {
+    if (!progress) return;
+    try {
+      await fetch(`${API_URL}/api/jobs/${progress.job_id}/cancel`, { method: 'POST' });
+    } catch (error) {
+      console.error('Error cancelling job:', error);
+    }
+  };
 
-      const data = await response.json();
-      
-      // Convert tests object to array for the table and cast to TestResult[]
-      const testsArray = Object.values(data.results) as TestResult[];
-      setTestResults(testsArray);
+  const handleRun = async () => {
+    setIsLoading(true);
+    try {
+      const status = await runJob(testResults);
 
-      alert('Evaluations re-run successfully');
+      alert(status === 'cancelled' ? 'Re-run cancelled' : 'Evaluations re-run successfully');
     } catch (error) {
       console.error('Error re-running evaluations:', error);
       alert('Failed to re-run evaluations');
@@ -82,7 +130,7 @@ function App() {
     setIsSyntheticLoading(true);
     try {
       // First generate synthetic data
-      const genResponse = await fetch('http://localhost:8000/api/generate-synthetic', {
+      const genResponse = await fetch(`${API_URL}/api/generate-synthetic`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -102,41 +150,26 @@ function App() {
 
       const genData = await genResponse.json();
       
-      // Now run tests with the synthetic data
-      const runResponse = await fetch('http://localhost:8000/api/rerun', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
+      // Now run tests with the synthetic data, replacing the table as results arrive
+      const evaluationResults = testResults[0]?.evaluation_results || [];
+      setTestResults([]);
+      const status = await runJob(genData.scenarios.map((scenario: any, index: number) => ({
+        test_id: index + 1,
+        call_type: scenario.type,
+        transcript: `Starting ${scenario.type} conversation\n\ncustomer_agent: ${scenario.first_message}`,
+        customer_config: {
+          params: {
+            model: config.params.model,
+            temperature: 0.7,
+          },
+          system_prompt: scenario.customer_prompt,
+          end_call_enabled: true,
         },
-        body: JSON.stringify({
-          config,
-          test_results: genData.scenarios.map((scenario: any, index: number) => ({
-            test_id: index + 1,
-            call_type: scenario.type,
-            transcript: `Starting ${scenario.type} conversation\n\ncustomer_agent: ${scenario.first_message}`,
-            customer_config: {
-              params: {
-                model: config.params.model,
-                temperature: 0.7,
-              },
-              system_prompt: scenario.customer_prompt,
-              end_call_enabled: true,
-            },
-            // Use the evaluation results from the existing test results
-            evaluation_results: testResults[0]?.evaluation_results || []
-          }))
-        }),
-      });
-
-      if (!runResponse.ok) {
-        throw new Error('Failed to run tests');
-      }
-
-      const runData = await runResponse.json();
-      const testsArray = Object.values(runData.results) as TestResult[];
-      setTestResults(testsArray);
+        // Use the evaluation results from the existing test results
+        evaluation_results: evaluationResults
+      })));
 
-      alert('Synthetic data generated and tests completed successfully');
+      alert(status === 'cancelled' ? 'Test run cancelled' : 'Synthetic data generated and tests completed successfully');
     } catch (error) {
       console.error('Error:', error);
       alert('Failed to generate synthetic data or run tests');
@@ -163,6 +196,8 @@ function App() {
         <DataTable
           data={testResults}
           onFileUpload={handleFileUpload}
+          progress={progress}
+          onCancel={handleCancel}
         />
       </div>
     </div>
@@ -1,14 +1,16 @@
 import React, { useState } from 'react';
-import { TestResult } from '../types';
+import { JobProgress, TestResult } from '../types';
 import { Upload } from 'lucide-react';
 import { Button } from "@/components/ui/button";
 
 interface DataTableProps {
   data: TestResult[];
   onFileUpload: (file: File) => void;
+  progress?: JobProgress | null;
+  onCancel?: () => void;
 }
 
-export function DataTable({ data, onFileUpload }: DataTableProps) {
+export function DataTable({ data, onFileUpload, progress, onCancel }: DataTableProps) {
   const [error, setError] = useState<string | null>(null);
   const fileInputRef = React.useRef<HTMLInputElement>(null);
   const [expandedTranscripts, setExpandedTranscripts] = useState<{[key: number]: boolean}>({});
@@ -47,7 +49,21 @@ export function DataTable({ data, onFileUpload }: DataTableProps) {
     <div className="bg-card text-card-foreground rounded-lg shadow-sm border">
       <div className="p-4 border-b">
         <div className="flex justify-between items-center">
-          <h2 className="text-lg font-semibold">Test Results</h2>
+          <div>
+            <h2 className="text-lg font-semibold">Test Results</h2>
+            {progress && (
+              <div className="flex items-center gap-2">
+                <p className="text-sm text-muted-foreground">
+                  Running: {progress.completed} / {progress.total} tests finished
+                </p>
+                {onCancel && (
+                  <Button variant="outline" size="sm" onClick={onCancel}>
+                    Cancel
+                  </Button>
+                )}
+              </div>
+            )}
+          </div>
           <div className="flex flex-col items-end gap-2">
             <Button 
               variant="outline" 
@@ -38,6 +38,8 @@ export function PromptSection({
               value={config.params.model}
               onChange={(e) => onConfigChange({
                 ...config,
+                // A loaded provider may not serve the new model; let the server infer it
+                provider: null,
                 params: { ...config.params, model: e.target.value }
               })}
             />
@@ -7,6 +7,8 @@ export interface EvaluationRow {
 }
 
 export interface ModelConfig {
+  // Provider name such as "anthropic" or "AnthropicProvider"; when missing the server infers it from the model
+  provider?: string | null;
   params: {
     model: string;
     temperature: number;
@@ -16,10 +18,44 @@ export interface ModelConfig {
   end_call_enabled: boolean;
 }
 
+export interface Turn {
+  speaker: string;
+  content: string;
+  latency: number | null;
+  ttft: number | null;
+  mean_token_gap?: number | null;
+  max_token_gap?: number | null;
+  input_tokens: number | null;
+  output_tokens: number | null;
+  cached_tokens: number | null;
+  cache_write_tokens?: number | null;
+  end_call: boolean;
+  cache_hit?: boolean;
+}
+
+export interface CostLine {
+  input_tokens: number;
+  output_tokens: number;
+  cached_tokens: number;
+  cache_write_tokens?: number;
+  cost: number | null;
+}
+
 export interface TestResult {
   test_id: number;
   call_type: string;
+  first_message?: string;
   transcript: string;
+  turns?: Turn[];
+  stop_reason?: string | null;
+  stop_detail?: string | null;
+  cost?: {
+    service_agent: CostLine;
+    customer_agent: CostLine;
+    judge: CostLine;
+    total_tokens: number;
+    total_cost: number | null;
+  } | null;
   evaluation_results: Array<{
     name: string;
     passed: boolean;
@@ -35,4 +71,9 @@ export interface RunDetails {
   tests: {
     [key: string]: TestResult;
   };
-}
\ No newline at end of file
+}
+export interface JobProgress {
+  job_id: string;
+  completed: number;
+  total: number;
+}